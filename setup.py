@@ -1,4 +1,4 @@
-from setuptools import setup
+from setuptools import find_packages, setup
 
 
 def readme():
@@ -14,11 +14,11 @@ setup(
     long_description=readme(),
     author="David Patterson",
     url="https://github.com/jdpatt/yabp",
-    packages=[
-        "yabp",
-    ],
+    packages=find_packages(exclude=["tests"]),
+    entry_points={"console_scripts": ["yabp=yabp.cli:main"]},
     include_package_data=True,
     install_requires=["pyserial"],
+    extras_require={"numpy": ["numpy"]},
     license="MIT",
     zip_safe=False,
     keywords="yabp",
@@ -5,6 +5,8 @@ import serial
 
 import yabp
 
+from .simulator import FakeBusPirate
+
 
 @pytest.fixture(scope="function")
 @patch.object(
@@ -22,3 +24,20 @@ def bus_pirate():
         return yabp.Base()
     except ConnectionError:
         pytest.skip("Test requires active bus pirate connection.")
+
+
+@pytest.fixture(scope="function")
+def bp_sim():
+    """Base mode talking to a simulated Bus Pirate."""
+    simulator = FakeBusPirate()
+    simulator.mode = "bbio"
+    with patch.object(yabp.Base, "open", return_value=simulator):
+        yield yabp.Base()
+
+
+@pytest.fixture(autouse=True)
+def discovery_cache(tmp_path, monkeypatch):
+    """Keep every test's discovery cache out of the user's home directory."""
+    path = tmp_path / "discovery.json"
+    monkeypatch.setenv("YABP_CACHE", str(path))
+    return path
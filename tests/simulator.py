@@ -0,0 +1,315 @@
+"""A serial-like stand-in for a Bus Pirate that speaks enough of the binary protocol for tests."""
+import threading
+import time
+from collections import deque
+
+
+class FakeBusPirate:
+    """Emulate the Bus Pirate's binary bitbang (BBIO) protocol in memory.
+
+    Every byte written is fed into a small protocol state machine and any reply is queued up for
+    the next `read()`.  It implements the same subset of the `serial.Serial` interface that yabp
+    uses so it can be handed straight to any of the modes.
+    """
+
+    def __init__(self, timeout: float = 0.1):
+        self.port = "sim"
+        self.timeout = timeout
+        self.baudrate = 115200
+        self.link_baudrate = 115200  # The rate the Bus Pirate's side of the link runs at.
+        self.max_link_baudrate = 4_000_000
+        self.is_open = True
+        self.mode = "terminal"
+        self.adc_value = 0x0200
+        self.pin_levels = deque()  # Replies to the next BBIO pin commands, 0x00 once empty.
+        self.chip_select = True
+        self.i2c_devices = {}  # 7 bit address to FakeI2CDevice
+        self._i2c_target = None
+        self._i2c_expect_address = False
+        self.spi_clocked = 0  # Bytes clocked while chip select was low.
+        self.written = bytearray()
+        self._output = bytearray()
+        self._streaming_adc = False
+        self.sniffing = False
+        self._lock = threading.Lock()
+        self._parser = self._protocol()
+        next(self._parser)
+
+    @property
+    def in_waiting(self) -> int:
+        """Return the number of reply bytes waiting to be read."""
+        return len(self._output)
+
+    def write(self, data) -> int:
+        """Feed every byte written into the protocol state machine."""
+        data = bytes(data)
+        with self._lock:
+            self.written.extend(data)
+            if self.baudrate != self.link_baudrate:
+                return len(data)  # Mismatched link speeds, the Bus Pirate only sees garbage.
+            for byte in data:
+                self._parser.send(byte)
+        return len(data)
+
+    def read(self, size: int = 1) -> bytes:
+        """Return up to `size` bytes of queued replies."""
+        with self._lock:
+            if self._streaming_adc:
+                self._output.extend(self.adc_value.to_bytes(2, "big") * (size // 2 + 1))
+            reply = bytes(self._output[:size])
+            del self._output[:size]
+        if self._streaming_adc:
+            time.sleep(0.001)
+        return reply
+
+    def sniffed(self, data: bytes) -> None:
+        """Queue encoded bus traffic for the running sniffer to report."""
+        with self._lock:
+            if self.sniffing:
+                self._output.extend(data)
+
+    def reset_input_buffer(self) -> None:
+        """Discard any queued replies."""
+        with self._lock:
+            self._output.clear()
+
+    def flush(self) -> None:
+        """Nothing is buffered on the way out."""
+
+    def close(self) -> None:
+        """Mark the port closed."""
+        self.is_open = False
+
+    def _reply(self, data: bytes) -> None:
+        self._output.extend(data)
+
+    def _protocol(self):
+        """Coroutine receiving one byte at a time and queueing replies."""
+        while True:
+            byte = yield
+            if self._streaming_adc:
+                self._streaming_adc = False  # Any byte stops the continuous ADC readings.
+            elif self.sniffing:
+                self.sniffing = False  # Any byte stops the sniffer and is then discarded.
+            elif self.mode == "terminal":
+                if byte == 0x00:
+                    self.mode = "bbio"
+                    self._reply(b"BBIO1")
+                else:
+                    yield from self._terminal(byte)
+            elif byte == 0x00:
+                self.mode = "bbio"
+                self._reply(b"BBIO1")
+            elif self.mode == "bbio":
+                yield from self._bbio(byte)
+            elif byte == 0x01:
+                self._reply({"spi": b"SPI1", "i2c": b"I2C1", "uart": b"ART1"}[self.mode])
+            else:
+                yield from getattr(self, f"_{self.mode}")(byte)
+
+    def _take(self, count: int):
+        """Collect the next `count` bytes of a multi-byte command."""
+        data = bytearray()
+        while len(data) < count:
+            data.append((yield))
+        return bytes(data)
+
+    def _line(self, byte: int):
+        """Collect a terminal line up to the carriage return."""
+        line = bytearray()
+        while byte != 0x0D:
+            if byte == 0x00:
+                self.mode = "bbio"
+                self._reply(b"BBIO1")
+                return None
+            line.append(byte)
+            byte = yield
+        return bytes(line).strip()
+
+    def _terminal(self, byte: int):
+        """Just enough of the user terminal to change the host link speed."""
+        line = yield from self._line(byte)
+        if line is None:
+            return
+        if line != b"b":
+            self._reply(b"\r\nHiZ>")
+            return
+        self._reply(b"\r\nSet serial port speed: (bps)\r\n ... \r\n10. BRG raw value\r\n\r\n(9)>")
+        line = yield from self._line((yield))
+        if line != b"10":
+            self._reply(b"\r\nHiZ>")
+            return
+        self._reply(b"\r\nEnter raw value for BRG\r\n\r\n(34)>")
+        divisor = int((yield from self._line((yield))))
+        self._reply(b"\r\nAdjust your terminal\r\nSpace to continue\r\n")
+        if 4_000_000 // (divisor + 1) <= self.max_link_baudrate:
+            self.link_baudrate = 4_000_000 // (divisor + 1)
+        while (yield) != 0x20:
+            pass
+        self._reply(b"\r\nHiZ>")
+
+    def _bbio(self, byte: int):
+        names = {0x01: "spi", 0x02: "i2c", 0x03: "uart"}
+        if byte in names:
+            self.mode = names[byte]
+            self._reply({0x01: b"SPI1", 0x02: b"I2C1", 0x03: b"ART1"}[byte])
+        elif byte == 0x0F:
+            self.mode = "terminal"
+            self._reply(b"\x01")
+            self.link_baudrate = 115200  # A hardware reset, the terminal starts at 115200 again.
+        elif byte == 0x12:
+            yield from self._take(5)
+            self._reply(b"\x01")
+        elif byte == 0x13:
+            self._reply(b"\x01")
+        elif byte == 0x14:
+            self._reply(self.adc_value.to_bytes(2, "big"))
+        elif byte == 0x15:
+            self._streaming_adc = True
+        elif byte & 0xE0 == 0x40 or byte & 0x80:
+            self._reply(bytes([self.pin_levels.popleft() if self.pin_levels else 0x00]))
+        yield from ()
+
+    def _mode_command(self, byte: int):
+        """Commands shared by the I2C, SPI and UART binary modes."""
+        if 0x10 <= byte <= 0x1F:
+            self._reply(b"\x01")
+            for _ in range((byte & 0x0F) + 1):
+                yield
+                self._reply(b"\x01")
+        else:
+            self._reply(b"\x01")
+
+    def _i2c(self, byte: int):
+        """Route raw I2C commands and write then read to the attached `FakeI2CDevice`s."""
+        if byte == 0x02:
+            self._i2c_target = None
+            self._i2c_expect_address = True
+            self._reply(b"\x01")
+        elif byte == 0x03:
+            if self._i2c_target:
+                self._i2c_target.stop()
+            self._i2c_target = None
+            self._reply(b"\x01")
+        elif byte == 0x04:
+            self._reply(bytes([self._i2c_target.read() if self._i2c_target else 0xFF]))
+        elif 0x10 <= byte <= 0x1F:
+            self._reply(b"\x01")
+            for _ in range((byte & 0x0F) + 1):
+                self._reply(b"\x00" if self._i2c_write_byte((yield)) else b"\x01")
+        elif byte == 0x08:
+            yield from self._i2c_write_then_read()
+        elif byte == 0x0F:
+            self.sniffing = True
+            self._reply(b"\x01")
+        else:
+            yield from self._mode_command(byte)
+
+    def _i2c_write_then_read(self):
+        """Handle the I2C write then read command."""
+        counts = yield from self._take(4)
+        data = yield from self._take(int.from_bytes(counts[:2], "big"))
+        read_count = int.from_bytes(counts[2:], "big")
+        self._i2c_expect_address = True
+        if not all(self._i2c_write_byte(value) for value in data):
+            self._reply(b"\x00")
+        elif self._i2c_target is None:
+            self._reply(b"\x01" + bytes(read_count))
+        else:
+            target = self._i2c_target
+            if read_count and target.select(read=True):
+                self._reply(b"\x01" + bytes(target.read() for _ in range(read_count)))
+            else:
+                self._reply(b"\x01" if not read_count else b"\x00")
+            target.stop()
+        self._i2c_target = None
+
+    def _i2c_write_byte(self, value: int) -> bool:
+        """Clock one byte onto the I2C bus and return whether it was ACKed.
+
+        With no devices attached every byte is ACKed, as if anything could be listening.
+        """
+        if not self.i2c_devices:
+            return True
+        if self._i2c_expect_address:
+            self._i2c_expect_address = False
+            device = self.i2c_devices.get(value >> 1)
+            self._i2c_target = device if device and device.select(read=value & 1) else None
+            return self._i2c_target is not None
+        if self._i2c_target is None:
+            return False
+        self._i2c_target.write(value)
+        return True
+
+    def _spi(self, byte: int):
+        """Clock in the inverse of every byte clocked out, tracking chip select."""
+        if 0x10 <= byte <= 0x1F:
+            self._reply(b"\x01")
+            for _ in range((byte & 0x0F) + 1):
+                self._reply(bytes([(yield) ^ 0xFF]))
+                self.spi_clocked += 1 if not self.chip_select else 0
+        elif byte in (0x0D, 0x0E):
+            self.sniffing = True
+            self._reply(b"\x01")
+        else:
+            if byte in (0x02, 0x03):
+                self.chip_select = byte == 0x03
+            yield from self._mode_command(byte)
+
+    def _uart(self, byte: int):
+        yield from self._mode_command(byte)
+
+
+class FakeI2CDevice:
+    """A register or memory based I2C target such as an EEPROM or GPIO expander.
+
+    The first `address_width` bytes written after the address set the register pointer and the
+    rest are written from there, wrapping within `page_size`.  After a write is stopped the
+    device NACKs its address `busy_polls` times, like an EEPROM in its write cycle.
+    """
+
+    def __init__(
+        self, size: int = 256, address_width: int = 1, page_size: int = 256, busy_polls: int = 0
+    ):
+        self.memory = bytearray(size)
+        self.address_width = address_width
+        self.page_size = page_size
+        self.busy_polls = busy_polls
+        self.pointer = 0
+        self.writes = 0  # Completed write transactions.
+        self._busy = 0
+        self._pointer_bytes = None
+        self._wrote = False
+
+    def select(self, read: bool) -> bool:
+        """Return whether the device ACKs its address."""
+        if self._busy:
+            self._busy -= 1
+            return False
+        self._pointer_bytes = None if read else bytearray()
+        return True
+
+    def write(self, value: int) -> None:
+        """Accept a byte written after the address."""
+        if self._pointer_bytes is not None and len(self._pointer_bytes) < self.address_width:
+            self._pointer_bytes.append(value)
+            if len(self._pointer_bytes) == self.address_width:
+                self.pointer = int.from_bytes(self._pointer_bytes, "big") % len(self.memory)
+            return
+        self.memory[self.pointer] = value
+        page = self.pointer - self.pointer % self.page_size
+        self.pointer = page + (self.pointer + 1) % self.page_size
+        self._wrote = True
+
+    def read(self) -> int:
+        """Return the byte at the pointer and advance it."""
+        value = self.memory[self.pointer]
+        self.pointer = (self.pointer + 1) % len(self.memory)
+        return value
+
+    def stop(self) -> None:
+        """Finish the transaction, starting a write cycle if anything was written."""
+        if self._wrote:
+            self.writes += 1
+            self._busy = self.busy_polls
+        self._wrote = False
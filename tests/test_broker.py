@@ -0,0 +1,80 @@
+import threading
+
+import pytest
+
+from yabp import broker
+from yabp.exceptions import CommandError
+from yabp.session import BusPirate
+
+from .simulator import FakeBusPirate, FakeI2CDevice
+
+
+@pytest.fixture
+def running_broker(tmp_path):
+    """A broker serving simulated Bus Pirates on a temporary socket."""
+    simulators = {}
+
+    def opener(port):
+        simulators[port] = FakeBusPirate()
+        return BusPirate(simulators[port])
+
+    server = broker.Broker(str(tmp_path / "broker.sock"), opener)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server, simulators
+    server.shutdown()
+    server.server_close()
+
+
+def test_remote_calls_and_batches(running_broker):
+    """Single calls and batches run on the adapter the broker keeps open."""
+    server, simulators = running_broker
+    with broker.I2C("sim0", server.socket_path) as bp:
+        bp.write_register(0x20, 0x00, 0xFF)
+        with bp.batch() as batch:
+            batch.send([0x40, 0x12])
+            batch.version()
+        assert batch.results == [b"\x00\x00", "I2C1"]
+        assert bp.config_peripherals() == 0x40
+    with broker.I2C("sim0", server.socket_path) as bp:
+        bp.start()
+    assert len(simulators) == 1
+
+
+def test_remote_errors_are_raised(running_broker):
+    """Errors in the broker are raised in the client and private methods are refused."""
+    server, _ = running_broker
+    with broker.SPI("sim1", server.socket_path) as bp:
+        with pytest.raises(ValueError):
+            bp.set_speed(9)
+        with pytest.raises(ValueError):
+            bp.call([["close", [], {}]])
+        with pytest.raises(CommandError):
+            bp.call([["nonexistent", [], {}]])
+
+
+def test_switching_modes_keeps_the_port_open(running_broker):
+    """Clients using different modes of one adapter share it without a reset."""
+    server, simulators = running_broker
+    with broker.I2C("sim2", server.socket_path) as i2c, broker.SPI(
+        "sim2", server.socket_path
+    ) as spi:
+        i2c.set_speed(3)
+        assert spi.version() == "SPI1"
+        assert i2c.version() == "I2C1"
+    assert len(simulators) == 1
+    assert b"\x0f" not in simulators["sim2"].written
+    assert simulators["sim2"].written.endswith(b"\x00\x02\x63\x01")
+
+
+def test_results_keep_their_types(running_broker):
+    """Int keyed results come back with int keys and unsendable ones are errors, not hangs."""
+    server, simulators = running_broker
+    with broker.I2C("sim3", server.socket_path) as bp:
+        bp.version()
+        simulators["sim3"].i2c_devices[0x20] = FakeI2CDevice(4)
+        simulators["sim3"].i2c_devices[0x21] = FakeI2CDevice(4)
+        assert bp.snapshot([0x20, 0x21], length=2) == {0x20: b"\x00\x00", 0x21: b"\x00\x00"}
+        with pytest.raises(TypeError):
+            bp.call([["serial", [], {}]])
+        assert bp.version() == "I2C1"
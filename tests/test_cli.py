@@ -0,0 +1,32 @@
+import subprocess
+import sys
+from unittest.mock import patch
+
+import pytest
+
+from yabp import cli
+
+from .simulator import FakeBusPirate
+
+
+def test_import_is_lazy():
+    """Importing yabp doesn't pull in pyserial or any of the modes."""
+    code = "import sys, yabp; print(any(m.startswith(('serial', 'yabp.')) for m in sys.modules))"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+    assert result.stdout.strip() == "False"
+
+
+def test_i2c_write_command():
+    """The i2c write command sends the address then the data between a start and stop."""
+    simulator = FakeBusPirate()
+    with patch("serial.Serial", return_value=simulator):
+        assert cli.main(["--port", "sim", "i2c", "write", "0x20", "0x00", "0xFF"]) == 0
+    assert b"\x02\x10\x40\x11\x00\xff\x03" in simulator.written
+
+
+def test_data_bytes_are_range_checked(capsys):
+    """A data value that doesn't fit in a byte is a usage error, not a traceback."""
+    with pytest.raises(SystemExit) as exit_info:
+        cli.main(["--port", "sim", "i2c", "write", "0x20", "300"])
+    assert exit_info.value.code == 2
+    assert "300 is not a byte" in capsys.readouterr().err
@@ -0,0 +1,64 @@
+import pytest
+
+import yabp
+from yabp.devices import EEPROM24, MCP23017
+from yabp.exceptions import DeviceError
+
+from .simulator import FakeBusPirate, FakeI2CDevice
+
+
+@pytest.fixture
+def eeprom_bus():
+    """An I2C mode with a simulated 24C02 at 0x50 that is busy for 3 polls after a write."""
+    simulator = FakeBusPirate()
+    simulator.i2c_devices[0x50] = FakeI2CDevice(256, page_size=8, busy_polls=3)
+    return yabp.I2C(simulator), simulator.i2c_devices[0x50]
+
+
+def test_write_then_read(eeprom_bus):
+    """Write then read sets the pointer and reads sequentially, NACKs raise."""
+    i2c, device = eeprom_bus
+    device.memory[0x10:0x14] = b"\x01\x02\x03\x04"
+    assert i2c.write_then_read([0x50 << 1, 0x10], 4) == b"\x01\x02\x03\x04"
+    with pytest.raises(DeviceError):
+        i2c.write_then_read([0x51 << 1, 0x00], 1)
+
+
+def test_write_then_read_waits_for_the_frame_to_cross_the_link(eeprom_bus):
+    """The status deadline of a maximum size write covers sending all of it at 115200 baud."""
+    i2c, _ = eeprom_bus
+    i2c.set_speed(3)  # 400kHz, so clocking the bus is quicker than the host link.
+    with pytest.raises(DeviceError):
+        i2c.write_then_read([0x51 << 1] + [0x00] * (i2c.MAX_WRITE_THEN_READ - 1))
+    assert i2c.serial.timeout > (5 + i2c.MAX_WRITE_THEN_READ) * 10 / 115200
+
+
+def test_eeprom_program_is_page_aware(eeprom_bus):
+    """Unaligned images are split at page boundaries and unchanged pages are skipped."""
+    i2c, device = eeprom_bus
+    eeprom = EEPROM24(i2c, "24C02", 0x50)
+    image = bytes(range(3, 23))
+    assert eeprom.program(image, start=5) == 4
+    assert device.memory[5:25] == image
+    assert device.writes == 4
+
+    changed = bytearray(image)
+    changed[10] ^= 0xFF
+    assert eeprom.program(bytes(changed), start=5) == 1
+    assert device.memory[5:25] == changed
+    assert eeprom.read() == bytes(device.memory)
+
+
+def test_mcp23017_play_packs_steps_into_writes():
+    """Patterns are written as GPIOA/GPIOB pairs, many steps per write then read command."""
+    np = pytest.importorskip("numpy")
+    simulator = FakeBusPirate()
+    # A two byte page makes the pointer toggle between GPIOA and GPIOB like IOCON.SEQOP.
+    simulator.i2c_devices[0x20] = device = FakeI2CDevice(0x16, page_size=2)
+    gpio_expander = MCP23017(0x20, yabp.I2C(simulator))
+
+    patterns = np.arange(5000, dtype=np.uint16) * 13
+    assert gpio_expander.play(patterns) > 0
+    assert device.memory[0x0A] & 0x20
+    assert device.memory[0x12:0x14] == int(patterns[-1]).to_bytes(2, "little")
+    assert device.writes == 1 + 3  # IOCON, then 2047 + 2047 + 906 steps.
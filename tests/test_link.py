@@ -0,0 +1,51 @@
+from unittest.mock import patch
+
+import yabp
+from yabp.link import DiscoveryCache, v3_baud_rate, v3_divisor
+
+from .simulator import FakeBusPirate
+
+
+def test_v3_divisor_round_trip():
+    """1Mbaud is a BRG of 3 on the v3."""
+    assert v3_divisor(1_000_000) == 3
+    assert v3_baud_rate(3) == 1_000_000
+
+
+def test_negotiate_v3_link_speed():
+    """The terminal speed menu is driven and the configuration is sent again after the reset."""
+    simulator = FakeBusPirate()
+    bp = yabp.I2C(simulator)
+    bp.pullups(True)
+    bp.set_speed(3)
+    written = len(simulator.written)
+    assert bp.negotiate_baud_rate(1_000_000, hardware="v3") == 1_000_000
+    assert simulator.baudrate == simulator.link_baudrate == 1_000_000
+    assert simulator.mode == "i2c"
+    assert simulator.written[-2:] == bytes([bp.config_peripherals, 0x63])
+    assert simulator.written.index(b"\x0f", written) > 0
+    # The v3 is back at 115200 baud after the reset in close(), so the rate is not cached.
+    assert "baud_rate" not in DiscoveryCache().get("sim")
+    bp.close()
+    assert simulator.link_baudrate == 115200
+
+
+def test_negotiate_falls_back_when_unsupported():
+    """If the Bus Pirate never answers at the new rate the old one is restored."""
+    simulator = FakeBusPirate()
+    simulator.max_link_baudrate = 115200
+    bp = yabp.I2C(simulator)
+    assert bp.negotiate_baud_rate(2_000_000, hardware="v3") == 115200
+    bp.start()
+    assert simulator.mode == "i2c"
+
+
+def test_open_uses_cached_rate():
+    """A rate stored in the discovery cache is tried first when opening the port."""
+    DiscoveryCache().update("sim", baud_rate=1_000_000)
+    simulator = FakeBusPirate()
+    simulator.link_baudrate = 1_000_000
+    with patch("serial.Serial", return_value=simulator):
+        yabp.I2C("sim")
+    assert simulator.baudrate == 1_000_000
+    assert simulator.mode == "i2c"
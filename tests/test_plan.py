@@ -0,0 +1,82 @@
+import pytest
+
+import yabp
+from yabp.exceptions import CommandError
+from yabp.plan import Plan
+
+from .simulator import FakeBusPirate, FakeI2CDevice
+
+
+class CountingBusPirate(FakeBusPirate):
+    """Count the calls to write and read."""
+
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    def write(self, data) -> int:
+        self.calls += 1
+        return super().write(data)
+
+    def read(self, size: int = 1) -> bytes:
+        self.calls += 1
+        return super().read(size)
+
+
+def test_prepared_i2c_plans_write_and_read():
+    """Each run of a plan is one write and one read with the slots patched in."""
+    simulator = CountingBusPirate()
+    simulator.i2c_devices[0x20] = device = FakeI2CDevice(0x16)
+    i2c = yabp.I2C(simulator)
+
+    plan = Plan(i2c)
+    plan.start()
+    plan.send(0x20 << 1, plan.slot("register"), plan.slot("value"))
+    plan.stop()
+    write_register = plan.prepare()
+
+    plan = Plan(i2c)
+    plan.write_then_read(0x20 << 1, plan.slot("register"), read=2, capture="ports")
+    plan.write_then_read(0x20 << 1, 0x00, read=1, capture="direction", decode=ord)
+    read_ports = plan.prepare()
+
+    simulator.calls = 0
+    write_register(register=0x12, value=0xA5)
+    write_register(register=0x13, value=0x5A)
+    assert simulator.calls == 4
+    assert device.memory[0x12:0x14] == b"\xa5\x5a"
+    assert read_ports(register=0x12) == {"ports": b"\xa5\x5a", "direction": 0}
+
+    del simulator.i2c_devices[0x20]
+    simulator.i2c_devices[0x21] = device  # Nothing ACKs 0x20 any more.
+    with pytest.raises(CommandError):
+        write_register(register=0x12, value=0x00)
+
+
+def test_prepared_spi_plan_captures_miso():
+    """SPI bulk transfers return what was clocked in."""
+    spi = yabp.SPI(FakeBusPirate())
+    plan = Plan(spi)
+    plan.start()
+    plan.send(0x03, plan.slot("address", width=2), 0x00, 0x00, capture="reply")
+    plan.stop()
+    read = plan.prepare()
+    assert read(address=0x1234)["reply"] == bytes(
+        value ^ 0xFF for value in b"\x03\x12\x34\x00\x00"
+    )
+
+
+def test_prepared_plan_deadline_covers_the_buffer():
+    """The read deadline allows for the whole buffer crossing the host link as well."""
+    spi = yabp.SPI(FakeBusPirate())
+    plan = Plan(spi)
+    plan.start()
+    for _ in range(64):
+        plan.send(*[0x00] * 16)
+    plan.stop()
+    prepared = plan.prepare()
+    deadlines = []
+    deadline = spi.timer.deadline
+    spi.timer.deadline = lambda *args: deadlines.append(args) or deadline(*args)
+    prepared()
+    assert deadlines == [(len(prepared.buffer) + prepared.reply_size, prepared.bus_bytes)]
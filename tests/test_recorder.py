@@ -0,0 +1,50 @@
+import pytest
+
+import yabp
+from yabp.exceptions import CommandError
+from yabp.recorder import READ, WRITE, RecordingSerial, ReplaySerial, read_sessions
+
+from .simulator import FakeBusPirate
+
+
+def test_record_and_replay_session(tmp_path):
+    """A recorded session replays the same replies without the Bus Pirate."""
+    path = tmp_path / "session.yrec"
+    with yabp.I2C(RecordingSerial(FakeBusPirate(), str(path))) as bp:
+        bp.write_register(0x20, 0x00, 0xFF)
+        acks = bp.send([0x40, 0x12])
+
+    sessions = read_sessions(str(path))
+    assert len(sessions) == 1
+    assert sessions[0][0].direction == WRITE and sessions[0][0].data == b"\x00"
+    assert sessions[0][1].direction == READ and sessions[0][1].data == b"BBIO1"
+    timestamps = [record.timestamp for record in sessions[0]]
+    assert timestamps == sorted(timestamps)
+
+    replay = ReplaySerial(str(path))
+    with yabp.I2C(replay) as bp:
+        bp.write_register(0x20, 0x00, 0xFF)
+        assert bp.send([0x40, 0x12]) == acks
+    assert replay.finished
+
+
+def test_replay_detects_divergence(tmp_path):
+    """Writing something other than what was recorded raises."""
+    path = tmp_path / "session.yrec"
+    yabp.I2C(RecordingSerial(FakeBusPirate(), str(path))).close()
+    with pytest.raises(CommandError):
+        with yabp.SPI(ReplaySerial(str(path))):
+            pass
+
+
+def test_recording_survives_a_crash(tmp_path):
+    """Records reach the disk without closing, and a truncated tail is ignored."""
+    path = tmp_path / "session.yrec"
+    bp = yabp.I2C(RecordingSerial(FakeBusPirate(), str(path)))
+    bp.write_register(0x20, 0x00, 0xFF)
+    sessions = read_sessions(str(path))
+    assert sessions[0][1].data == b"BBIO1"
+
+    with open(path, "ab") as recording:
+        recording.write(b"\x00\x01\x02")
+    assert len(read_sessions(str(path))[0]) == len(sessions[0])
@@ -0,0 +1,73 @@
+import time
+
+import yabp
+from yabp.scheduler import PollingScheduler
+
+from .simulator import FakeBusPirate, FakeI2CDevice
+
+
+def test_due_jobs_share_one_burst():
+    """Jobs on nearby registers are merged and a missing device doesn't stop the others."""
+    simulator = FakeBusPirate()
+    simulator.i2c_devices[0x48] = sensor = FakeI2CDevice()
+    sensor.memory[0:8] = bytes(range(10, 18))
+    scheduler = PollingScheduler(yabp.I2C(simulator), max_in_flight=4)
+    scheduler.add("low", 0x48, 0x00, length=2, period=0.01)
+    scheduler.add("high", 0x48, 0x05, length=3, period=0.01)
+    scheduler.add("missing", 0x49, 0x00, period=0.01)
+
+    del simulator.written[:]
+    readings = {reading.name: reading for reading in scheduler.poll()}
+    # One read of registers 0 to 7 of 0x48 and one of 0x49.
+    assert bytes(simulator.written) == b"\x08\x00\x02\x00\x08\x90\x00\x08\x00\x02\x00\x01\x92\x00"
+    assert readings["low"].data == b"\x0a\x0b"
+    assert readings["high"].data == b"\x0f\x10\x11"
+    assert readings["missing"].data is None
+
+    assert scheduler.poll() == []  # Nothing is due again yet.
+    statistics = scheduler.statistics()
+    assert statistics["missing"]["errors"] == 1
+    assert statistics["low"]["count"] == 1
+
+
+def test_background_polling_reports_missed_deadlines():
+    """Readings stream through the results queue and skipped periods count as misses."""
+    simulator = FakeBusPirate()
+    simulator.i2c_devices[0x48] = FakeI2CDevice()
+    scheduler = PollingScheduler(yabp.I2C(simulator))
+    job = scheduler.add("temperature", 0x48, 0x00, period=0.005)
+    job.due -= 0.1
+    scheduler.start()
+    time.sleep(0.05)
+    scheduler.stop()
+    assert scheduler.results.qsize() == job.count > 1
+    assert job.missed >= 10
+
+
+def test_lost_reply_resyncs_instead_of_misreading(monkeypatch):
+    """A reply that never arrives fails the rest of the burst and resyncs the I2C mode."""
+    simulator = FakeBusPirate()
+    simulator.i2c_devices[0x48] = FakeI2CDevice()
+    simulator.i2c_devices[0x49] = FakeI2CDevice()
+    i2c = yabp.I2C(simulator)
+    scheduler = PollingScheduler(i2c, max_in_flight=1)
+    scheduler.add("first", 0x48, 0x00, period=0.01)
+    scheduler.add("second", 0x49, 0x00, period=0.01)
+
+    write = simulator.write
+
+    def write_and_lose_reply(data):
+        written = write(data)
+        simulator.reset_input_buffer()
+        monkeypatch.setattr(simulator, "write", write)
+        return written
+
+    monkeypatch.setattr(simulator, "write", write_and_lose_reply)
+    resync = i2c.resync
+    resyncs = []
+    monkeypatch.setattr(i2c, "resync", lambda: resyncs.append(resync()))
+    readings = scheduler.poll()
+    assert [reading.data for reading in readings] == [None, None]
+    assert len(resyncs) == 1
+    assert scheduler.statistics()["second"]["errors"] == 1
+    assert simulator.mode == "i2c"
@@ -0,0 +1,24 @@
+import yabp
+
+from .simulator import FakeBusPirate
+
+
+def test_switching_modes_only_sends_mode_bytes():
+    """Switching modes reuses the port and restores each mode's cached settings."""
+    simulator = FakeBusPirate()
+    with yabp.BusPirate(simulator) as bp:
+        bp.i2c.set_speed(3)
+        bp.i2c.pullups(enable=True)
+        bp.spi.output_state(high=True)
+        assert simulator.mode == "spi"
+
+        del simulator.written[:]
+        bp.i2c.start()
+        assert simulator.mode == "i2c"
+        assert bytes(simulator.written) == b"\x00\x02\x48\x63\x02"
+
+        del simulator.written[:]
+        bp.spi.set_chip_select(high=False)
+        assert bytes(simulator.written) == b"\x00\x01\x8a\x02"
+        assert bp.spi.config_spi == 0x8A
+    assert not simulator.is_open
@@ -0,0 +1,83 @@
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+import yabp
+from yabp.shared import BULK, HIGH, PriorityLock, SharedSession
+
+from .simulator import FakeBusPirate
+
+
+def test_threads_share_one_adapter():
+    """Two threads issuing whole transactions never see each other's replies."""
+    session = SharedSession(yabp.I2C(FakeBusPirate()))
+    errors = []
+
+    def worker(priority):
+        try:
+            for _ in range(50):
+                session.with_priority(priority).write_register(0x20, 0x12, 0xAA)
+                with session.transaction(priority) as i2c:
+                    i2c.start()
+                    assert i2c.send([0x40, 0x13]) == b"\x00\x00"
+                    i2c.stop()
+        except Exception as error:  # pylint: disable=broad-except
+            errors.append(error)
+
+    threads = [threading.Thread(target=worker, args=(p,)) for p in (HIGH, BULK)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    assert session.metrics[HIGH]["count"] == session.metrics[BULK]["count"] == 100
+
+
+def test_high_priority_jumps_the_queue():
+    """A waiting high priority transaction runs before an earlier bulk one."""
+    session = SharedSession(yabp.I2C(FakeBusPirate()))
+    order = []
+
+    def waiter(priority):
+        with session.transaction(priority):
+            order.append(priority)
+
+    with session.transaction():
+        bulk = threading.Thread(target=waiter, args=(BULK,))
+        bulk.start()
+        time.sleep(0.02)
+        high = threading.Thread(target=waiter, args=(HIGH,))
+        high.start()
+        time.sleep(0.02)
+    bulk.join()
+    high.join()
+    assert order == [HIGH, BULK]
+    assert session.metrics[BULK]["max"] >= 0.03
+
+
+def test_interrupted_waiter_leaves_the_queue():
+    """A high priority waiter that is interrupted doesn't block the waiters behind it."""
+    lock = PriorityLock()
+    held = threading.Event()
+    done = threading.Event()
+
+    def owner():
+        lock.acquire()
+        held.set()
+        done.wait()
+        lock.release()
+
+    thread = threading.Thread(target=owner)
+    thread.start()
+    held.wait()
+    with patch.object(lock._condition, "wait", side_effect=KeyboardInterrupt):
+        with pytest.raises(KeyboardInterrupt):
+            lock.acquire(HIGH)
+    done.set()
+    thread.join()
+    waiter = threading.Thread(target=lambda: (lock.acquire(BULK), lock.release()), daemon=True)
+    waiter.start()
+    waiter.join(timeout=1)
+    assert not waiter.is_alive()
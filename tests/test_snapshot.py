@@ -0,0 +1,65 @@
+import pytest
+
+import yabp
+from yabp.snapshot import SnapshotHistory, diff
+
+from .simulator import FakeBusPirate, FakeI2CDevice
+
+
+def test_diff_lists_changed_registers():
+    """Only registers that differ are reported, offset by the snapshot's start."""
+    before = bytes(range(32))
+    after = bytearray(before)
+    after[3], after[30] = 0xFF, 0x00
+    assert diff(before, before) == []
+    assert diff(before, bytes(after), start=0x10) == [(0x13, 3, 0xFF), (0x2E, 30, 0x00)]
+
+
+def test_snapshot_history_records_drift(tmp_path):
+    """Snapshots of several devices go into a ring in the history file and can be reopened."""
+    simulator = FakeBusPirate()
+    for address in (0x20, 0x48):
+        simulator.i2c_devices[address] = FakeI2CDevice()
+    i2c = yabp.I2C(simulator)
+    assert i2c.snapshot(0x20, start=4, length=4) == bytes(4)
+    with pytest.raises(ValueError):
+        i2c.snapshot(0x20, start=250, length=8)
+
+    path = str(tmp_path / "drift.ysnp")
+    with SnapshotHistory(path, [0x20, 0x48], length=16, capacity=3) as history:
+        history.capture(i2c)
+        history.capture(i2c)
+        simulator.i2c_devices[0x48].memory[5] = 0x42
+        history.capture(i2c)
+        history.capture(i2c)
+        assert len(history) == 3 and history.total == 4
+
+    with SnapshotHistory(path, [0x20, 0x48], length=16) as history:
+        assert history[-1][1][0x48][5] == 0x42
+        assert [(address, changes) for _, address, changes in history.changes()] == [
+            (0x48, [(5, 0x00, 0x42)])
+        ]
+    with pytest.raises(ValueError):
+        SnapshotHistory(path, [0x21], length=16)
+    with pytest.raises(ValueError):
+        SnapshotHistory(str(tmp_path / "empty.ysnp"), [0x20], capacity=0)
+
+
+def test_snapshot_history_skips_missing_devices(tmp_path):
+    """A device that stops acknowledging is recorded as missing without losing the others."""
+    simulator = FakeBusPirate()
+    for address in (0x20, 0x48):
+        simulator.i2c_devices[address] = FakeI2CDevice()
+    i2c = yabp.I2C(simulator)
+
+    with SnapshotHistory(str(tmp_path / "drift.ysnp"), [0x20, 0x48], length=16) as history:
+        history.capture(i2c)
+        device = simulator.i2c_devices.pop(0x48)
+        assert history.capture(i2c) == {0x20: bytes(16), 0x48: None}
+        device.memory[5] = 0x42
+        simulator.i2c_devices[0x48] = device
+        history.capture(i2c)
+        assert history[1][1][0x48] is None
+        assert [(address, changes) for _, address, changes in history.changes()] == [
+            (0x48, [(5, 0x00, 0x42)])
+        ]
@@ -0,0 +1,49 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import yabp  # noqa: E402
+from yabp.sniffer import I2CDecoder, SPIDecoder, read_log  # noqa: E402
+
+from .simulator import FakeBusPirate  # noqa: E402
+
+
+def test_i2c_decoder_handles_split_chunks():
+    """Transactions are decoded across chunk boundaries, including repeated starts."""
+    decoder = I2CDecoder()
+    stream = b"[\\\x90+\\\x00+[\\\x91+\\\x5b+\\\x2d-]"  # Data bytes that look like markers.
+    records = decoder.feed(stream[:5], 1.0) + decoder.feed(stream[5:], 2.0)
+    assert [record.address for record in records] == [0x90, 0x91]
+    assert records[0].data == b"\x00" and not records[0].stopped
+    assert records[1].data == b"[-" and records[1].acks == (True, True, False)
+    assert records[1].read and records[1].stopped
+    assert records[1].timestamp == 2.0
+
+
+def test_spi_decoder_splits_long_transactions():
+    """MOSI/MISO pairs are framed by chip select and capped at max_length."""
+    decoder = SPIDecoder(max_length=2)
+    records = decoder.feed(b"[\\\x9f\x00\\\x00\xef\\\x00\x40]", 0.5)
+    assert [(record.mosi, record.miso) for record in records] == [
+        (b"\x9f\x00", b"\x00\xef"),
+        (b"\x00", b"\x40"),
+    ]
+
+
+def test_i2c_sniffer_streams_and_logs(tmp_path):
+    """Sniffed traffic arrives through the iterator and round trips through the log."""
+    simulator = FakeBusPirate()
+    i2c = yabp.I2C(simulator)
+    path = tmp_path / "capture.ysnf"
+    with i2c.sniff(log_path=str(path)) as sniffer:
+        simulator.sniffed(b"[\\\x40+\\\x12+\\\xaa+]" * 3)
+        transactions = [next(iter(sniffer)) for _ in range(3)]
+    assert {transaction.data for transaction in transactions} == {b"\x12\xaa"}
+    assert not simulator.sniffing
+    assert len(sniffer.raw) == 3 * 11
+    assert read_log(str(path)) == transactions
+    content = path.read_bytes()
+    for cut in (2, 10):  # Mid data and mid header of the last 17 byte record.
+        path.write_bytes(content[:-cut])
+        assert read_log(str(path)) == transactions[:2]
+    assert i2c.version() == "I2C1"
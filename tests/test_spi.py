@@ -0,0 +1,30 @@
+import pytest
+
+import yabp
+
+from .simulator import FakeBusPirate
+
+
+@pytest.mark.parametrize("max_in_flight", [1, 4])
+def test_exchange_fills_receive_buffer(max_in_flight):
+    """Long exchanges are chunked into frames with chip select held low throughout."""
+    simulator = FakeBusPirate()
+    spi = yabp.SPI(simulator)
+    tx = bytes(range(100))
+    rx = bytearray(100)
+    assert spi.exchange(tx, rx, max_in_flight) is rx
+    assert rx == bytes(byte ^ 0xFF for byte in tx)
+    assert simulator.spi_clocked == 100
+    assert simulator.chip_select
+
+
+def test_exchange_numpy_buffers():
+    """NumPy arrays are exchanged as raw bytes and filled in place."""
+    np = pytest.importorskip("numpy")
+    spi = yabp.SPI(FakeBusPirate())
+    tx = np.arange(20, dtype=np.uint16)
+    rx = np.zeros_like(tx)
+    spi.exchange(tx, rx)
+    assert np.array_equal(rx, tx ^ 0xFFFF)
+    with pytest.raises(ValueError):
+        spi.exchange(tx, bytearray(3))
@@ -0,0 +1,53 @@
+import time
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from yabp.streaming import RingBuffer  # noqa: E402
+
+
+def test_ring_buffer_keeps_newest_samples():
+    """Wrapping past capacity keeps only the most recent samples in order."""
+    buffer = RingBuffer(4)
+    buffer.extend(np.arange(3.0), np.arange(3.0))
+    buffer.extend(np.arange(3.0, 6.0), np.arange(3.0, 6.0))
+    timestamps, values = buffer.data()
+    assert list(values) == [2.0, 3.0, 4.0, 5.0]
+    assert list(timestamps) == [2.0, 3.0, 4.0, 5.0]
+    assert buffer.dropped == 2
+
+
+def test_stream_voltage_stop_and_resume(bp_sim):
+    """Continuous ADC samples are decoded into volts and capture can be resumed."""
+    bp_sim.serial.adc_value = 0x100
+    stream = bp_sim.stream_voltage(capacity=1000)
+    time.sleep(0.05)
+    stream.stop()
+    captured = stream.buffer.total
+    assert captured > 0
+    stream.resume()
+    time.sleep(0.05)
+    stream.stop()
+    timestamps, volts = stream.data()
+    assert stream.buffer.total > captured
+    assert len(volts) <= 1000
+    assert np.allclose(volts, 1.65)
+    assert np.all(np.diff(timestamps) >= 0)
+    assert bp_sim.measure_voltage() == pytest.approx(1.65)
+
+
+def test_sample_pins_decodes_bit_planes_and_edges(bp_sim):
+    """Pin states from pipelined bursts become bit planes with edges on the right samples."""
+    levels = [0x00, 0x04, 0x04, 0x00, 0x14, 0x14, 0x10] * 300
+    bp_sim.serial.pin_levels.extend(levels)
+    samples = bp_sim.sample_pins(len(levels), burst=256)
+
+    assert len(samples) == len(levels)
+    assert (samples.timestamps[1:] >= samples.timestamps[:-1]).all()
+    assert samples.pin("CLK")[:4].tolist() == [False, True, True, False]
+    timestamps, rising = samples.edges("CLK")
+    assert rising[:4].tolist() == [True, False, True, False]
+    assert timestamps[0] == samples.timestamps[1]
+    assert samples.edge_counts() == {"AUX": 599, "MOSI": 0, "CLK": 1200, "MISO": 0, "CS": 0}
+    assert bp_sim.pin_state == 0x10
@@ -0,0 +1,37 @@
+import json
+
+import yabp
+from yabp.devices import MCP23017
+from yabp.trace import Tracer
+
+from .simulator import FakeBusPirate
+
+
+def test_trace_nests_device_mode_and_serial_spans(tmp_path):
+    """Device operations contain the mode calls they make, which contain the serial traffic."""
+    path = tmp_path / "trace.json"
+    with Tracer(str(path)) as tracer:
+        bp = yabp.I2C(FakeBusPirate())
+        bp.trace(tracer)
+        gpio_expander = tracer.attach(MCP23017(0x20, bp))
+        with tracer.span("fixture"):
+            gpio_expander.set_all_direction(gpio_expander.DIRECTION.OUTPUT)
+
+    spans = {"user": [], "device": [], "mode": [], "serial": []}
+    for event in json.loads(path.read_text())["traceEvents"]:
+        if event["ph"] == "X":
+            spans[event["cat"]].append(event)
+
+    def inside(inner, outer):
+        end = outer["ts"] + outer["dur"]
+        return outer["ts"] <= inner["ts"] and inner["ts"] + inner["dur"] <= end
+
+    (fixture,) = spans["user"]
+    (device,) = spans["device"]
+    assert device["name"] == "MCP23017.set_all_direction" and inside(device, fixture)
+    writes = [event for event in spans["mode"] if event["name"] == "I2C.write_register"]
+    assert len(writes) == 2 and all(inside(write, device) for write in writes)
+    assert any(inside(event, writes[0]) for event in spans["serial"])
+
+    tracer.detach(gpio_expander)
+    assert "set_all_direction" not in vars(gpio_expander)
@@ -2,7 +2,12 @@ from contextlib import nullcontext as does_not_raise
 
 import pytest
 
+import yabp
 from yabp.exceptions import CommandError
+from yabp.modes.base import solve_pwm
+from yabp.timing import ReplyTimer
+
+from .simulator import FakeBusPirate
 
 
 def test_basic_init(bp_loop):
@@ -17,3 +22,120 @@ def test_command_and_read_byte(bp_loop, tests, expected):
     """Write \x01 and see if the same value is returned. If not, raise CommandError."""
     with expected:
         bp_loop.command(tests)
+
+
+def test_measure_voltage(bp_sim):
+    """A 0x200 reading is half of the 6.6V full scale."""
+    bp_sim.serial.adc_value = 0x200
+    assert bp_sim.measure_voltage() == pytest.approx(3.3)
+
+
+def test_reply_deadline_adapts():
+    """Deadlines grow with reply size and bus speed and shrink as latency is learned."""
+    timer = ReplyTimer(115200, latency=0.05)
+    assert timer.deadline(1) == pytest.approx(0.101, abs=0.001)
+    timer.set_bus_rate(5_000, bits_per_byte=9)
+    assert timer.deadline(16, bus_bytes=16) > timer.deadline(1, bus_bytes=1)
+    timer.learn(0.002 + timer.transfer_time(1), 1)
+    assert timer.deadline(1) > 0.05  # One fast reply only nudges the estimate.
+    for _ in range(50):
+        timer.learn(0.002 + timer.transfer_time(1), 1)
+    assert timer.deadline(1) < 0.03
+    assert timer.latency == ReplyTimer.MINIMUM_LATENCY
+    timer.back_off()
+    assert timer.latency > ReplyTimer.MINIMUM_LATENCY
+
+
+def test_resync_recovers_mid_command():
+    """A half sent command and stray replies are cleared and the mode and speed restored."""
+    simulator = FakeBusPirate()
+    bp = yabp.I2C(simulator)
+    bp.set_speed(3)
+    simulator.write(b"\x08\x00")  # The Bus Pirate now waits for the rest of the command.
+    simulator._reply(b"junk")  # Left over replies to earlier commands.
+
+    del simulator.written[:]
+    assert bp.resync() == 4
+    assert simulator.mode == "i2c"
+    assert simulator.written.endswith(b"\x02\x63")
+    assert bp.version() == "I2C1"
+
+
+def test_resync_stops_a_running_stream(monkeypatch):
+    """Continuous ADC readings left running are stopped rather than drained forever."""
+    simulator = FakeBusPirate()
+    bp = yabp.Base(simulator)
+    simulator.write(b"\x15")
+    simulator.read(64)
+    bp.resync()
+    assert not simulator._streaming_adc
+    assert simulator.mode == "bbio"
+
+    # An adapter that never stops talking is only drained for a bounded time.
+    monkeypatch.setattr(simulator, "read", lambda size=1: b"\xff" * size)
+    with pytest.raises(CommandError):
+        bp.resync(drain_time=0.01)
+
+
+def test_retry_resyncs_after_command_error():
+    """A transaction that fails once is run again after resyncing."""
+    bp = yabp.I2C(FakeBusPirate())
+    calls = []
+
+    def transaction():
+        calls.append(None)
+        if len(calls) == 1:
+            raise CommandError("Bus Pirate did not acknowledge command.")
+        return bp.version()
+
+    assert bp.retry(transaction) == "I2C1"
+    assert len(calls) == 2
+    calls.clear()
+    with pytest.raises(CommandError):
+        bp.retry(transaction, attempts=1)
+
+
+def test_pwm_solver_picks_finest_prescaler(bp_sim):
+    """The smallest prescaler that fits is chosen and repeated settings aren't resent."""
+    setting = bp_sim.configure_pwm(1e-3, 0.5)
+    assert setting.prescaler == 0 and setting.period_register == 15999
+    assert setting.period == pytest.approx(1e-3) and setting.duty_cycle == pytest.approx(
+        0.5, abs=1e-4
+    )
+    assert solve_pwm(0.1, 0.25).prescaler == 2
+    with pytest.raises(ValueError):
+        solve_pwm(10.0, 0.5)
+
+    del bp_sim.serial.written[:]
+    bp_sim.configure_pwm(1e-3, 0.5)
+    bp_sim.set_pwm_duty(0.5)
+    assert not bp_sim.serial.written
+    bp_sim.set_pwm_duty(0.25)
+    assert bytes(bp_sim.serial.written) == b"\x12\x00\x0f\x9f\x3e\x7f"
+
+
+def test_pwm_duty_sweep_is_batched(bp_sim):
+    """A sweep streams one command per step and leaves the last duty cycle configured."""
+    bp_sim.configure_pwm(1e-3, 0.0)
+    assert bp_sim.sweep_pwm_duty([step / 1000 for step in range(1000)], chunk_size=300) == 1000
+    assert bp_sim.pwm.duty_register == int(15999 * 0.999)
+
+
+def test_pwm_duty_sweep_validates_and_tracks_acknowledged_steps(bp_sim, monkeypatch):
+    """Bad duty cycles are refused up front and a failed chunk leaves the last ACKed step."""
+    bp_sim.configure_pwm(1e-3, 0.0)
+    for duty_cycles in ([0.5, 5.0], [-0.1]):
+        with pytest.raises(ValueError):
+            bp_sim.sweep_pwm_duty(duty_cycles)
+
+    read = bp_sim.serial.read
+    reads = []
+
+    def lose_reply(size=1):
+        reads.append(size)
+        return read(size)[:1] if len(reads) == 2 else read(size)
+
+    monkeypatch.setattr(bp_sim.serial, "read", lose_reply)
+    with pytest.raises(CommandError):
+        bp_sim.sweep_pwm_duty([0.1, 0.2, 0.3, 0.4, 0.5, 0.6], chunk_size=2)
+    assert bp_sim.pwm.duty_register == int(15999 * 0.3)
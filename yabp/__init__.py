@@ -1,11 +1,27 @@
 """Yet Another Bus Pirate Libray."""
 import logging
+from typing import TYPE_CHECKING
 
-from yabp.modes import I2C, SPI, UART, Base
+if TYPE_CHECKING:
+    from yabp.modes import I2C, SPI, UART, Base
+    from yabp.session import BusPirate
 
 __author__ = "David Patterson"
 __version__ = "1.1.0"
-__all__ = ["Base", "I2C", "SPI", "UART"]
+__all__ = ["Base", "BusPirate", "I2C", "SPI", "UART"]
 
 
 logging.getLogger("yabp").addHandler(logging.NullHandler())
+
+
+def __getattr__(name):
+    """Import the modes on first use so `import yabp` and the command line start quickly."""
+    if name == "BusPirate":
+        from yabp.session import BusPirate
+
+        return BusPirate
+    if name in __all__:
+        from yabp import modes
+
+        return getattr(modes, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,6 @@
+"""Allow running the command line interface with `python -m yabp`."""
+import sys
+
+from yabp.cli import main
+
+sys.exit(main())
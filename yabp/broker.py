@@ -0,0 +1,304 @@
+"""Share Bus Pirates between processes through a local broker.
+
+The broker owns the serial ports and keeps each adapter open in binary mode, so clients skip
+the reset handshake entirely.  Clients asking for different modes of the same adapter share one
+`yabp.session.BusPirate`, so switching between them only costs the mode change.  Clients
+connect over a Unix socket and send whole batches of mode method calls per message:
+
+```python
+# In one process (or `yabp broker`):
+Broker().serve_forever()
+
+# In any number of others:
+with yabp.broker.I2C("/dev/ttyUSB0") as bp:
+    bp.write_register(0x20, 0x00, 0xFF)
+    with bp.batch() as batch:
+        batch.read_register(0x20, 0x12)
+        batch.read_register(0x20, 0x13)
+    gpioa, gpiob = batch.results
+```
+
+Messages are a 4 byte big endian length followed by JSON.  Bytes are sent as
+``{"__bytes__": "<hex>"}`` and dicts whose keys aren't all strings, such as a multi-address
+`snapshot`, as ``{"__items__": [[key, value], ...]}`` so the keys survive the trip.
+"""
+import json
+import logging
+import os
+import socket
+import socketserver
+import struct
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+from yabp.exceptions import CommandError, DeviceError
+from yabp.shared import NORMAL, SharedSession
+
+log = logging.getLogger("yabp.broker")
+
+_LENGTH = struct.Struct(">I")
+_ERRORS = {
+    "CommandError": CommandError,
+    "DeviceError": DeviceError,
+    "TypeError": TypeError,
+    "ValueError": ValueError,
+    "ConnectionError": ConnectionError,
+}
+_NOT_REMOTE = {"open", "close", "record", "stream_voltage", "trace", "sniff"}
+_MODE_VIEWS = {"Base": "base", "I2C": "i2c", "SPI": "spi", "UART": "uart"}
+
+
+def default_socket_path() -> str:
+    """Return the broker's socket path, overridable with the YABP_BROKER variable."""
+    return os.environ.get(
+        "YABP_BROKER", os.path.join(tempfile.gettempdir(), f"yabp-{os.getuid()}.sock")
+    )
+
+
+def _encode(value):
+    if isinstance(value, (bytes, bytearray)):
+        return {"__bytes__": bytes(value).hex()}
+    raise TypeError(f"{type(value).__name__} can't be sent to the broker.")
+
+
+def _tag_keys(value):
+    """Wrap dicts with non-string keys, which JSON would otherwise silently turn into strings."""
+    if isinstance(value, dict):
+        if all(isinstance(key, str) for key in value):
+            return {key: _tag_keys(item) for key, item in value.items()}
+        return {"__items__": [[key, _tag_keys(item)] for key, item in value.items()]}
+    if isinstance(value, (list, tuple)):
+        return [_tag_keys(item) for item in value]
+    return value
+
+
+def _decode(value: dict):
+    if "__bytes__" in value:
+        return bytes.fromhex(value["__bytes__"])
+    if "__items__" in value:
+        return dict(value["__items__"])
+    return value
+
+
+def send_message(connection: socket.socket, message: Any) -> None:
+    """Send one length prefixed JSON message.
+
+    Raises TypeError, without sending anything, if the message can't be encoded.
+    """
+    payload = json.dumps(_tag_keys(message), default=_encode).encode()
+    connection.sendall(_LENGTH.pack(len(payload)) + payload)
+
+
+def receive_message(connection: socket.socket) -> Any:
+    """Receive one length prefixed JSON message, or None if the other end hung up."""
+    header = _receive_exactly(connection, _LENGTH.size)
+    if header is None:
+        return None
+    payload = _receive_exactly(connection, _LENGTH.unpack(header)[0])
+    if payload is None:
+        return None
+    return json.loads(payload, object_hook=_decode)
+
+
+def _receive_exactly(connection: socket.socket, size: int) -> Optional[bytes]:
+    data = bytearray()
+    while len(data) < size:
+        chunk = connection.recv(size - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return bytes(data)
+
+
+def _open_bus_pirate(port: Optional[str]):
+    from yabp.session import BusPirate
+
+    return BusPirate(port)
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    """Serve one client connection until it disconnects."""
+
+    server: "Broker"
+
+    def handle(self) -> None:
+        while True:
+            request = receive_message(self.request)
+            if request is None:
+                return
+            reply = self.server.execute(request)
+            try:
+                send_message(self.request, reply)
+            except (TypeError, ValueError) as error:
+                log.debug(f"Reply can't be sent: {error}")
+                send_message(
+                    self.request, {"error": {"type": type(error).__name__, "message": str(error)}}
+                )
+
+
+class Broker(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Own the Bus Pirates and run the batches of calls clients send over a Unix socket.
+
+    `opener(port)` opens an adapter as a `yabp.session.BusPirate`, e.g. `opener("COM3")`.
+    Tests can hand in one that uses a simulated port.  Each port is wrapped in a
+    `yabp.shared.SharedSession` so batches from different clients never interleave, and the
+    mode a batch asks for is switched to inside its transaction.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        socket_path: Optional[str] = None,
+        opener: Callable[[Optional[str]], Any] = _open_bus_pirate,
+    ):
+        self.socket_path = socket_path or default_socket_path()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        super().__init__(self.socket_path, _Handler)
+        self.opener = opener
+        self._adapters: Dict[Optional[str], SharedSession] = {}
+        self._adapters_lock = threading.Lock()
+        log.info(f"Bus Pirate broker listening on {self.socket_path}")
+
+    def _adapter(self, port: Optional[str]) -> SharedSession:
+        """Return the session for a port, opening the port the first time it is used.
+
+        Sessions stay open until the broker closes, so one returned here is never closed under
+        a client waiting for its transaction.
+        """
+        with self._adapters_lock:
+            if port not in self._adapters:
+                self._adapters[port] = SharedSession(self.opener(port))
+            return self._adapters[port]
+
+    def execute(self, request: dict) -> dict:
+        """Run every call in a request as one transaction and return the results."""
+        try:
+            if request["mode"] not in _MODE_VIEWS:
+                raise ValueError(f"{request['mode']} is not a Bus Pirate mode.")
+            session = self._adapter(request.get("port"))
+            results: List[Any] = []
+            with session.transaction(request.get("priority", NORMAL)) as bus_pirate:
+                mode = getattr(bus_pirate, _MODE_VIEWS[request["mode"]])
+                for name, args, kwargs in request["calls"]:
+                    if name.startswith("_") or name in _NOT_REMOTE:
+                        raise ValueError(f"{name} can't be called through the broker.")
+                    attribute = getattr(mode, name)
+                    results.append(
+                        attribute(*args, **kwargs) if callable(attribute) else attribute
+                    )
+            return {"results": results}
+        except Exception as error:  # pylint: disable=broad-except
+            log.debug(f"Request failed: {error}")
+            return {"error": {"type": type(error).__name__, "message": str(error)}}
+
+    def server_close(self) -> None:
+        """Stop listening and close every adapter."""
+        super().server_close()
+        with self._adapters_lock:
+            for session in self._adapters.values():
+                session.mode.close()
+            self._adapters.clear()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+
+class Batch:
+    """Collects calls made on it and sends them to the broker as one message on exit."""
+
+    def __init__(self):
+        self.calls: List[list] = []
+        self.results: List[Any] = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.calls.append([name, args, kwargs])
+
+        return queue
+
+
+class RemoteMode:
+    """A mode living in the broker with the same methods as the local one.
+
+    Properties are fetched by calling them, e.g. `bp.config_peripherals()`.
+    """
+
+    MODE = ""
+
+    def __init__(
+        self, port: Optional[str] = None, socket_path: Optional[str] = None, priority=NORMAL
+    ):
+        self.port = port
+        self.priority = priority
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.connect(socket_path or default_socket_path())
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        """Allow using the remote mode as a context manager."""
+        return self
+
+    def __exit__(self, *args):
+        """Disconnect from the broker, which keeps the adapter open."""
+        self.close()
+
+    def close(self) -> None:
+        """Disconnect from the broker."""
+        self._socket.close()
+
+    def call(self, calls: List[list]) -> List[Any]:
+        """Send a batch of [name, args, kwargs] calls and return their results."""
+        request = {"port": self.port, "mode": self.MODE, "priority": self.priority}
+        request["calls"] = calls
+        with self._lock:
+            send_message(self._socket, request)
+            reply = receive_message(self._socket)
+        if reply is None:
+            raise ConnectionError("The broker closed the connection.")
+        if "error" in reply:
+            raise _ERRORS.get(reply["error"]["type"], CommandError)(reply["error"]["message"])
+        return reply["results"]
+
+    @contextmanager
+    def batch(self):
+        """Queue up calls made on the yielded batch and send them in one message."""
+        batch = Batch()
+        yield batch
+        if batch.calls:
+            batch.results = self.call(batch.calls)
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        def remote(*args, **kwargs):
+            return self.call([[name, args, kwargs]])[0]
+
+        return remote
+
+
+class Base(RemoteMode):
+    """Base mode of a Bus Pirate owned by the broker."""
+
+    MODE = "Base"
+
+
+class I2C(RemoteMode):
+    """I2C mode of a Bus Pirate owned by the broker."""
+
+    MODE = "I2C"
+
+
+class SPI(RemoteMode):
+    """SPI mode of a Bus Pirate owned by the broker."""
+
+    MODE = "SPI"
+
+
+class UART(RemoteMode):
+    """UART mode of a Bus Pirate owned by the broker."""
+
+    MODE = "UART"
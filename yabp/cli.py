@@ -0,0 +1,221 @@
+"""Command line interface for yabp.
+
+Everything beyond argparse is imported inside the command that needs it so that short commands
+called from shell scripts don't pay for modules they never use.
+"""
+import argparse
+import logging
+import sys
+from typing import List, Optional
+
+log = logging.getLogger("yabp.cli")
+
+
+def _integer(value: str) -> int:
+    """Parse decimal, hex (0x) or binary (0b) integers."""
+    return int(value, 0)
+
+
+def _byte(value: str) -> int:
+    """Parse an integer that has to fit in a byte."""
+    byte = _integer(value)
+    if not 0 <= byte <= 0xFF:
+        raise argparse.ArgumentTypeError(f"{value} is not a byte (0 to 255)")
+    return byte
+
+
+def _format(data: bytes) -> str:
+    return " ".join(f"{byte:02X}" for byte in data)
+
+
+def _connect(args, mode: str):
+    """Open the requested mode using the global port options."""
+    from yabp import modes
+
+    return getattr(modes, mode)(args.port, args.baud_rate)
+
+
+def _i2c_read_bytes(bp, address: int, count: int, register: Optional[int] = None) -> bytes:
+    """Read raw bytes from an i2c device, optionally setting the register pointer first."""
+    if register is not None:
+        bp.start()
+        bp.send([address << 1, register])
+    bp.start()
+    bp.send(address << 1 | 0x01)
+    data = b""
+    for index in range(count):
+        data += bp.read_byte()
+        if index < count - 1:
+            bp.ack()
+    bp.nack()
+    bp.stop()
+    return data
+
+
+def scan(args) -> int:
+    """List the serial ports that look like a Bus Pirate."""
+    import serial.tools.list_ports
+
+    found = 0
+    for port in serial.tools.list_ports.comports(include_links=True):
+        if any(vid in port.hwid for vid in ["0403", "04D8"]):
+            print(f"{port.device}\t{port.hwid}")
+            found += 1
+    return 0 if found else 1
+
+
+def i2c_read(args) -> int:
+    """Read bytes from an i2c device."""
+    with _connect(args, "I2C") as bp:
+        print(_format(_i2c_read_bytes(bp, args.address, args.count, args.register)))
+    return 0
+
+
+def i2c_write(args) -> int:
+    """Write bytes to an i2c device."""
+    with _connect(args, "I2C") as bp:
+        bp.start()
+        bp.send(args.address << 1)
+        for offset in range(0, len(args.data), 16):
+            bp.send(args.data[offset : offset + 16])
+        bp.stop()
+    return 0
+
+
+def i2c_dump(args) -> int:
+    """Print a device's registers as a hex table."""
+    with _connect(args, "I2C") as bp:
+        data = _i2c_read_bytes(bp, args.address, args.length, args.start)
+    for offset in range(0, len(data), 16):
+        print(f"{args.start + offset:04X}: {_format(data[offset : offset + 16])}")
+    return 0
+
+
+def spi_transfer(args) -> int:
+    """Clock bytes out with chip select held low and print what was clocked in."""
+    with _connect(args, "SPI") as bp:
+        bp.set_speed(args.speed)
+        received = bp.exchange(bytes(args.data))
+    print(_format(received))
+    return 0
+
+
+def uart_monitor(args) -> int:
+    """Copy everything received on the UART to stdout until interrupted."""
+    import time
+
+    with _connect(args, "UART") as bp:
+        bp.set_speed(args.speed)
+        bp.enable_rx(True)
+        end = time.monotonic() + args.duration if args.duration else None
+        try:
+            while end is None or time.monotonic() < end:
+                data = bp.serial.read(max(1, bp.serial.in_waiting))
+                if data:
+                    sys.stdout.buffer.write(data)
+                    sys.stdout.buffer.flush()
+        except KeyboardInterrupt:
+            pass
+        bp.enable_rx(False)
+    return 0
+
+
+def flash_dump(args) -> int:
+    """Dump an SPI NOR flash with the standard read (0x03) command."""
+    command = bytes([0x03]) + args.start.to_bytes(3, "big")
+    with _connect(args, "SPI") as bp, open(args.output, "wb") as output:
+        bp.set_speed(args.speed)
+        received = bp.exchange(command + b"\xff" * args.length)
+        output.write(received[len(command) :])
+    return 0
+
+
+def broker(args) -> int:
+    """Run a broker sharing the Bus Pirates with other processes until interrupted."""
+    from yabp.broker import Broker
+
+    server = Broker(args.socket)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Build the argument parser for every command."""
+    parser = argparse.ArgumentParser(prog="yabp", description="Yet Another Bus Pirate")
+    parser.add_argument("-p", "--port", help="serial port, found automatically if omitted")
+    parser.add_argument("-b", "--baud-rate", type=int, default=115200)
+    parser.add_argument("-v", "--verbose", action="count", default=0)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("scan", help=scan.__doc__).set_defaults(func=scan)
+
+    i2c = commands.add_parser("i2c", help="i2c commands").add_subparsers(
+        dest="i2c_command", required=True
+    )
+    read = i2c.add_parser("read", help=i2c_read.__doc__)
+    read.add_argument("address", type=_integer)
+    read.add_argument("count", type=_integer)
+    read.add_argument("-r", "--register", type=_integer)
+    read.set_defaults(func=i2c_read)
+    write = i2c.add_parser("write", help=i2c_write.__doc__)
+    write.add_argument("address", type=_integer)
+    write.add_argument("data", type=_byte, nargs="+")
+    write.set_defaults(func=i2c_write)
+    dump = i2c.add_parser("dump", help=i2c_dump.__doc__)
+    dump.add_argument("address", type=_integer)
+    dump.add_argument("--start", type=_integer, default=0)
+    dump.add_argument("--length", type=_integer, default=256)
+    dump.set_defaults(func=i2c_dump)
+
+    spi = commands.add_parser("spi", help="spi commands").add_subparsers(
+        dest="spi_command", required=True
+    )
+    transfer = spi.add_parser("transfer", help=spi_transfer.__doc__)
+    transfer.add_argument("data", type=_byte, nargs="+")
+    transfer.add_argument("-s", "--speed", type=int, default=0, help="0-7, see SPI.set_speed")
+    transfer.set_defaults(func=spi_transfer)
+
+    uart = commands.add_parser("uart", help="uart commands").add_subparsers(
+        dest="uart_command", required=True
+    )
+    monitor = uart.add_parser("monitor", help=uart_monitor.__doc__)
+    monitor.add_argument("-s", "--speed", type=int, default=10, help="1-10, see UART.set_speed")
+    monitor.add_argument("-d", "--duration", type=float, help="seconds, forever if omitted")
+    monitor.set_defaults(func=uart_monitor)
+
+    flash = commands.add_parser("flash", help="spi flash commands").add_subparsers(
+        dest="flash_command", required=True
+    )
+    flash_read = flash.add_parser("dump", help=flash_dump.__doc__)
+    flash_read.add_argument("output")
+    flash_read.add_argument("--start", type=_integer, default=0)
+    flash_read.add_argument("--length", type=_integer, required=True)
+    flash_read.add_argument("-s", "--speed", type=int, default=4, help="0-7, see SPI.set_speed")
+    flash_read.set_defaults(func=flash_dump)
+
+    serve = commands.add_parser("broker", help=broker.__doc__)
+    serve.add_argument("-s", "--socket", help="unix socket path, see yabp.broker")
+    serve.set_defaults(func=broker)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Run the command line interface."""
+    from yabp.exceptions import CommandError
+
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=[logging.WARNING, logging.INFO, logging.DEBUG][min(args.verbose, 2)])
+    try:
+        return args.func(args)
+    except (CommandError, ConnectionError, OSError) as error:
+        log.error(error)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,5 @@
 """Any device specific classes that wrap Bus Pirate or one of its modes."""
+from .eeprom import EEPROM24
 from .mcp23017 import MCP23017
 
-__all__ = ["MCP23017"]
+__all__ = ["EEPROM24", "MCP23017"]
@@ -0,0 +1,174 @@
+"""Bus Pirate Control of 24Cxx I2C Serial EEPROMs."""
+import logging
+import time
+from typing import NamedTuple, Optional, Union
+
+import yabp
+from yabp.exceptions import DeviceError
+
+log = logging.getLogger("yabp.EEPROM24")
+
+
+class Part(NamedTuple):
+    """The geometry of a 24Cxx part."""
+
+    size: int
+    page_size: int
+    address_width: int
+
+
+class EEPROM24:
+    """A 24Cxx serial EEPROM such as the 24C02 or 24C256.
+
+    Writes are split into page aligned chunks each sent as one write then read command, and the
+    end of every write cycle is detected by ACK polling rather than sleeping.  Everything read or
+    written is kept in a read-back cache so `program()` only writes the pages that differ.
+
+    Parts with one address byte and more than 256 bytes (24C04/08/16) take the upper address bits
+    in the low bits of the device address, as does the 24C1024 beyond 64K.
+    """
+
+    PARTS = {
+        "24C01": Part(128, 8, 1),
+        "24C02": Part(256, 8, 1),
+        "24C04": Part(512, 16, 1),
+        "24C08": Part(1024, 16, 1),
+        "24C16": Part(2048, 16, 1),
+        "24C32": Part(4096, 32, 2),
+        "24C64": Part(8192, 32, 2),
+        "24C128": Part(16384, 64, 2),
+        "24C256": Part(32768, 64, 2),
+        "24C512": Part(65536, 128, 2),
+        "24C1024": Part(131072, 256, 2),
+    }
+
+    def __init__(
+        self,
+        bus_pirate,
+        part: str = "24C02",
+        seven_bit_address: int = 0x50,
+        write_cycle_timeout: float = 0.02,
+    ):
+        if part not in self.PARTS:
+            raise ValueError(f"Unknown EEPROM part: {part}.")
+        self.i2c = bus_pirate
+        self.part = self.PARTS[part]
+        self.address = seven_bit_address
+        self.write_cycle_timeout = write_cycle_timeout
+        self.cache: list = [None] * self.part.size  # Known contents, None where never seen.
+        self._busy = False  # A write cycle may still be in progress.
+
+    @property
+    def size(self) -> int:
+        """Return the size of the memory in bytes."""
+        return self.part.size
+
+    def _block_size(self) -> int:
+        """Return how much memory one device address covers."""
+        return 1 << (8 * self.part.address_width)
+
+    def _header(self, memory_address: int) -> bytes:
+        """Return the device address byte and memory address bytes for a location."""
+        device = self.address | (memory_address // self._block_size())
+        offset = memory_address % self._block_size()
+        return bytes([device << 1]) + offset.to_bytes(self.part.address_width, "big")
+
+    def _check_range(self, start: int, length: int) -> None:
+        if start < 0 or length < 0 or start + length > self.size:
+            raise ValueError(f"{start}+{length} is outside the {self.size} byte EEPROM.")
+
+    def read(self, start: int = 0, length: Optional[int] = None) -> bytes:
+        """Read `length` bytes (the rest of the memory by default) with sequential reads.
+
+        Each command reads as much as possible, limited by the Bus Pirate's 4096 byte maximum
+        and by the boundary of the current device address block.
+        """
+        if length is None:
+            length = self.size - start
+        self._check_range(start, length)
+        self.wait_until_ready()
+        data = bytearray()
+        while len(data) < length:
+            address = start + len(data)
+            chunk = min(
+                length - len(data),
+                self.i2c.MAX_WRITE_THEN_READ,
+                self._block_size() - address % self._block_size(),
+            )
+            data += self.i2c.write_then_read(self._header(address), chunk)
+        self.cache[start : start + length] = data
+        log.debug(f"Read {length} bytes from {start:#x}")
+        return bytes(data)
+
+    def write(self, start: int, data: Union[bytes, bytearray]) -> int:
+        """Write data in page aligned chunks and return the number of pages written."""
+        self._check_range(start, len(data))
+        pages = 0
+        offset = 0
+        while offset < len(data):
+            address = start + offset
+            chunk = min(len(data) - offset, self.part.page_size - address % self.part.page_size)
+            self._write_page(address, data[offset : offset + chunk])
+            offset += chunk
+            pages += 1
+        return pages
+
+    def _write_page(self, address: int, data) -> None:
+        """Write within one page once any previous write cycle has finished."""
+        self.wait_until_ready()
+        self.i2c.write_then_read(self._header(address) + bytes(data))
+        self.cache[address : address + len(data)] = bytes(data)
+        self._busy = True
+
+    def wait_until_ready(self) -> None:
+        """Poll the device address until the EEPROM ACKs, which it does once a write is done."""
+        if not self._busy:
+            return
+        deadline = time.monotonic() + self.write_cycle_timeout
+        polls = 0
+        while True:
+            polls += 1
+            try:
+                self.i2c.write_then_read([self.address << 1])
+                break
+            except DeviceError:
+                if time.monotonic() > deadline:
+                    raise DeviceError(
+                        f"EEPROM at {self.address:#x} still busy after "
+                        f"{self.write_cycle_timeout}s."
+                    ) from None
+        self._busy = False
+        log.debug(f"Write cycle finished after {polls} polls.")
+
+    def program(self, image: Union[bytes, bytearray], start: int = 0, verify: bool = True) -> int:
+        """Write an image, skipping every page that already holds the same data.
+
+        Anything not in the read-back cache is read first in one bulk read.  Returns the number
+        of pages written.  With `verify`, the written range is read back and compared.
+        """
+        self._check_range(start, len(image))
+        end = start + len(image)
+        if None in self.cache[start:end]:
+            self.read(start, len(image))
+        pages = 0
+        page_size = self.part.page_size
+        for page_start in range(start - start % page_size, end, page_size):
+            low = max(page_start, start)
+            high = min(page_start + page_size, end)
+            wanted = image[low - start : high - start]
+            if bytes(self.cache[low:high]) != bytes(wanted):
+                self._write_page(low, wanted)
+                pages += 1
+        self.wait_until_ready()
+        if verify and pages and self.read(start, len(image)) != bytes(image):
+            raise DeviceError("EEPROM contents did not match the image after programming.")
+        log.info(f"Programmed {len(image)} bytes at {start:#x}, {pages} pages written.")
+        return pages
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.DEBUG)
+    with yabp.I2C() as bp:
+        eeprom = EEPROM24(bp, "24C02", 0x50)
+        eeprom.program(b"Serial Number: 0001")
+        print(eeprom.read(0, 32))
@@ -2,6 +2,7 @@
 import logging
 import time
 from enum import Enum
+from typing import Optional
 
 import yabp
 
@@ -14,6 +15,7 @@ class MCP23017:
     MCP23017_MEMORYMAP = {
         "IODIRA": 0x00,
         "IODIRB": 0x01,
+        "IOCON": 0x0A,
         "GPIOA": 0x12,
         "GPIOB": 0x13,
     }
@@ -40,6 +42,7 @@ class MCP23017:
         self.registers = {
             "IODIRA": 0xFF,
             "IODIRB": 0xFF,
+            "IOCON": 0x00,
             "GPIOA": 0x00,
             "GPIOB": 0x00,
         }
@@ -104,6 +107,38 @@ class MCP23017:
             self._write_register(register)
         log.debug(f"Setting {pin} to logic level: {logic_level.name}")
 
+    def play(self, patterns, steps_per_write: Optional[int] = None) -> float:
+        """Write a sequence of 16 bit port states as fast as the I2C bus allows.
+
+        `patterns` is anything numpy can turn into uint16s, with GPIOA in the low byte and GPIOB
+        in the high byte.  IOCON.SEQOP is set so the address pointer toggles between GPIOA and
+        GPIOB, letting a single write carry one A/B pair per step.  Each write then read
+        command carries up to 2047 steps, or `steps_per_write` if given.
+
+        Returns the achieved update rate in steps per second.  Requires numpy.
+        """
+        import numpy as np
+
+        data = np.ascontiguousarray(patterns, dtype="<u2").ravel().tobytes()
+        maximum_steps = (self.i2c.MAX_WRITE_THEN_READ - 2) // 2
+        steps_per_write = min(steps_per_write or maximum_steps, maximum_steps)
+        if not self.registers["IOCON"] & 0x20:
+            self.registers["IOCON"] |= 0x20  # SEQOP: disable the incrementing address pointer.
+            self._write_register("IOCON")
+
+        header = bytes([self.address << 1, self.MCP23017_MEMORYMAP["GPIOA"]])
+        start = time.perf_counter()
+        for offset in range(0, len(data), steps_per_write * 2):
+            self.i2c.write_then_read(header + data[offset : offset + steps_per_write * 2])
+        elapsed = time.perf_counter() - start
+
+        steps = len(data) // 2
+        if steps:
+            self.registers["GPIOA"], self.registers["GPIOB"] = data[-2], data[-1]
+        rate = steps / elapsed if elapsed else 0.0
+        log.debug(f"Played {steps} steps at {rate:.0f} steps per second.")
+        return rate
+
     def _is_valid_pin(self, pin: str):
         """Raise an exception if the pin is invalid."""
         if pin not in self.PINS:
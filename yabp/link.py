@@ -0,0 +1,134 @@
+"""Host side serial link handling: the discovery cache and baud rate negotiation.
+
+The Bus Pirate v3 talks to the host through an FTDI USB-UART so the host baud rate really
+limits throughput.  Its terminal can switch to any rate the PIC's baud rate generator (BRG)
+can produce.  The v4 is a USB CDC device so the baud rate is ignored and the link runs as fast
+as USB allows.
+"""
+import json
+import logging
+import os
+import time
+from typing import Optional
+
+from yabp.exceptions import CommandError
+
+log = logging.getLogger("yabp.link")
+
+DEFAULT_BAUD_RATE = 115200
+V3_BRG_CLOCK = 4_000_000  # Fcy / 4 with BRGH set; baud = 4MHz / (BRG + 1)
+VENDOR_IDS = {"0403": "v3", "04D8": "v4"}
+
+
+def default_cache_path() -> str:
+    """Return where the discovery cache lives, overridable with the YABP_CACHE variable."""
+    return os.environ.get(
+        "YABP_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "yabp", "discovery.json")
+    )
+
+
+class DiscoveryCache:
+    """A small JSON file remembering what was learned about each serial port.
+
+    Entries are keyed by the port name, e.g. ``{"COM3": {"hwid": "...", "baud_rate": 1000000}}``.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or default_cache_path()
+
+    def load(self) -> dict:
+        """Return the whole cache, or an empty one if it is missing or unreadable."""
+        try:
+            with open(self.path) as cache:
+                return json.load(cache)
+        except (OSError, ValueError):
+            return {}
+
+    def get(self, port: str) -> dict:
+        """Return what is known about a port."""
+        return self.load().get(port, {})
+
+    def update(self, port: str, **values) -> None:
+        """Merge values into a port's entry.  Values of None are removed."""
+        entries = self.load()
+        entry = entries.setdefault(port, {})
+        entry.update(values)
+        for key in [key for key, value in entry.items() if value is None]:
+            del entry[key]
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, "w") as cache:
+                json.dump(entries, cache, indent=2, sort_keys=True)
+        except OSError as error:
+            log.warning(f"Could not update the discovery cache: {error}")
+
+
+def hardware_from_hwid(hwid: str) -> Optional[str]:
+    """Return "v3" or "v4" from a pyserial hardware id string."""
+    for vendor_id, hardware in VENDOR_IDS.items():
+        if vendor_id in hwid.upper():
+            return hardware
+    return None
+
+
+def detect_hardware(port: Optional[str]) -> Optional[str]:
+    """Work out which Bus Pirate is on a port from the cache or the USB vendor id."""
+    if not port:
+        return None
+    hwid = DiscoveryCache().get(port).get("hwid")
+    if hwid is None:
+        import serial.tools.list_ports
+
+        for info in serial.tools.list_ports.comports(include_links=True):
+            if info.device == port:
+                hwid = info.hwid
+    return hardware_from_hwid(hwid) if hwid else None
+
+
+def v3_divisor(baud_rate: int) -> int:
+    """Return the BRG value giving the closest v3 baud rate to the one requested."""
+    return max(0, round(V3_BRG_CLOCK / baud_rate) - 1)
+
+
+def v3_baud_rate(divisor: int) -> int:
+    """Return the baud rate a v3 runs at for a BRG value."""
+    return V3_BRG_CLOCK // (divisor + 1)
+
+
+def read_until(serial_port, marker: bytes, timeout: float = 1.0) -> bytes:
+    """Read from the port until the marker shows up or the timeout passes."""
+    data = b""
+    deadline = time.monotonic() + timeout
+    while marker not in data and time.monotonic() < deadline:
+        data += serial_port.read(max(1, serial_port.in_waiting))
+    return data
+
+
+def set_v3_terminal_speed(serial_port, baud_rate: int) -> int:
+    """Drive the v3 terminal's `b` menu to change the host link speed.
+
+    The Bus Pirate must be sitting at the terminal prompt.  Option 10 of the speed menu takes a
+    raw BRG value, after which the Bus Pirate waits for a space at the new speed.  The host port
+    is switched to the new rate before the space is sent.  Returns the new rate or raises
+    CommandError if the terminal never answered at the new speed.
+    """
+    divisor = v3_divisor(baud_rate)
+    actual = v3_baud_rate(divisor)
+    serial_port.write(b"\r")
+    read_until(serial_port, b">", 0.2)
+    serial_port.write(b"b\r")
+    if b">" not in read_until(serial_port, b">"):
+        raise CommandError("Bus Pirate did not show the speed menu.")
+    serial_port.write(b"10\r")
+    if b">" not in read_until(serial_port, b">"):
+        raise CommandError("Bus Pirate did not ask for a BRG value.")
+    serial_port.write(f"{divisor}\r".encode())
+    read_until(serial_port, b"continue")
+    serial_port.baudrate = actual
+    time.sleep(0.01)
+    serial_port.reset_input_buffer()
+    serial_port.write(b" ")
+    if b">" not in read_until(serial_port, b">"):
+        raise CommandError(f"Bus Pirate did not answer at {actual} baud.")
+    log.info(f"Bus Pirate terminal now running at {actual} baud.")
+    return actual
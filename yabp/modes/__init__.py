@@ -1,7 +1,20 @@
 """Modes supported by yabp."""
-from .base import Base
-from .i2c import I2C
-from .spi import SPI
-from .uart import UART
+import importlib
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from yabp.modes.base import Base
+    from yabp.modes.i2c import I2C
+    from yabp.modes.spi import SPI
+    from yabp.modes.uart import UART
 
 __all__ = ["Base", "I2C", "UART", "SPI"]
+
+_MODULES = {"Base": "base", "I2C": "i2c", "SPI": "spi", "UART": "uart"}
+
+
+def __getattr__(name):
+    """Import each mode's module on first use."""
+    if name in _MODULES:
+        return getattr(importlib.import_module(f"{__name__}.{_MODULES[name]}"), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,19 +1,34 @@
 """Base Mode."""
 import logging
+import time
 from abc import ABC
-from typing import List, Union
+from typing import Callable, List, Optional, Protocol, TypeVar, Union, cast
 
 import serial
-import serial.tools.list_ports
 
 from yabp.exceptions import CommandError
+from yabp.link import DiscoveryCache, detect_hardware, set_v3_terminal_speed
+from yabp.timing import ReplyTimer
 
 log = logging.getLogger("yabp")
 
+T = TypeVar("T")
+
+
+class SerialLike(Protocol):
+    """What a mode needs of an already open port, e.g. a `yabp.recorder.ReplaySerial`."""
+
+    def read(self, size: int = 1) -> bytes:
+        """Read up to `size` bytes."""
+
+    def write(self, data) -> Optional[int]:
+        """Write the bytes in `data`."""
+
 
 class AbstractBusPirateMode(ABC):
     """Base Mode for any of the Bus Pirate Modes."""
 
+    MODE = b"BBIO1"
     _MODES = {
         b"BBIO1": b"\x00",
         b"SPI1": b"\x01",
@@ -22,11 +37,17 @@ class AbstractBusPirateMode(ABC):
         b"1W01": b"\x04",
         b"RAW1": b"\x05",
     }
+    _POWER_ON_CONFIG = {"_config_peripherals": 0x40}  # Shadows reset when the mode is entered.
+    _speed: Optional[int] = None  # The bus speed setting, for modes that have one.
 
     def __init__(
-        self, port: Union[str, None] = None, baud_rate: int = 115200, timeout: float = 0.1
+        self,
+        port: Union[str, SerialLike, None] = None,
+        baud_rate: int = 115200,
+        timeout: float = 0.1,
     ):
         self.serial: serial.Serial = self.open(port, baud_rate, timeout)
+        self.timer = ReplyTimer(getattr(self.serial, "baudrate", None), latency=timeout / 2)
         self._config_peripherals = 0x40  # Voltage and Pull-ups disabled.  AUX and CS are low.
 
     def __enter__(self):
@@ -51,25 +72,186 @@ class AbstractBusPirateMode(ABC):
 
         Send 0x00 to the user terminal (max.) 20 times to enter the raw binary bitbang mode.
         The bp will response with BBIO1 when it succeeds.
+
+        `port` may also be an already open serial-like object such as a
+        `yabp.recorder.RecordingSerial` or `yabp.recorder.ReplaySerial`, in which case it is used
+        as is.
+
+        If `negotiate_baud_rate()` stored a faster rate for this port in the discovery cache (only
+        done for the v4), that rate is tried first and the requested `baud_rate` is the fallback.
         """
+        cached_rate = None
         try:
-            if not port:
-                port = get_serial_port()
-            serial_port = serial.Serial(port=port, baudrate=baud_rate, timeout=timeout)
+            if hasattr(port, "read"):
+                serial_port = port
+            else:
+                if not port:
+                    port = get_serial_port()
+                cached_rate = DiscoveryCache().get(port).get("baud_rate")
+                serial_port = serial.Serial(port=port, baudrate=baud_rate, timeout=timeout)
             log.info(f"Connected to Bus Pirate on {port}")
         except serial.serialutil.SerialException:
             log.error("Failed to connect to Bus Pirate.")
             raise
 
-        serial_port.reset_input_buffer()
-        for _ in range(0, 20):
-            serial_port.write(b"\x00")
-            status = serial_port.read(5)
-            if b"BBIO" in status:
-                serial_port.reset_input_buffer()
+        if cached_rate and cached_rate != baud_rate:
+            serial_port.baudrate = cached_rate
+            if enter_bitbang(serial_port, timeout=0.01):
+                log.info(f"Using the cached link speed of {cached_rate} baud.")
                 return serial_port
+            log.info(f"Bus Pirate is no longer at {cached_rate} baud, falling back.")
+            serial_port.baudrate = baud_rate
+            DiscoveryCache().update(port, baud_rate=None)
+        if enter_bitbang(serial_port):
+            return serial_port
         raise CommandError("Failed to Reset Bus Pirate.")
 
+    def negotiate_baud_rate(
+        self, baud_rate: int = 1_000_000, hardware: Optional[str] = None
+    ) -> int:
+        """Move the host link to a faster baud rate and return the rate agreed on.
+
+        A v3 is sent back to its terminal to change speed with the `b` menu, which resets it, so
+        the cached configuration is sent again afterwards.  The v4 is a USB CDC device so only the
+        host side changes.  `hardware` ("v3" or "v4") is detected from the USB vendor id when not
+        given.
+
+        The link is verified with the BBIO handshake.  If that fails at the new rate, the
+        previous rate is tried again so the connection is never left unusable.  On a v4 the
+        agreed rate is stored in the discovery cache and tried first the next time the port is
+        opened.  A v3 drops back to 115200 baud whenever it is reset, including by `close()`, so
+        its rate is not cached and has to be negotiated again after every open.
+        """
+        port = getattr(self.serial, "port", None)
+        hardware = hardware or detect_hardware(port)
+        previous = self.serial.baudrate
+        if hardware not in ("v3", "v4"):
+            log.warning(f"Unknown Bus Pirate hardware on {port}, staying at {previous} baud.")
+            return previous
+
+        if hardware == "v4":
+            self.serial.baudrate = baud_rate
+        else:
+            self._set_mode(b"BBIO1")
+            self._reset_bus_pirate()
+            try:
+                set_v3_terminal_speed(self.serial, baud_rate)
+            except CommandError as error:
+                log.warning(f"Failed to change the link speed: {error}")
+
+        for rate in dict.fromkeys([self.serial.baudrate, previous]):
+            self.serial.baudrate = rate
+            if hardware == "v3":
+                self.serial.write(b" ")  # In case the terminal is still waiting for a space.
+            if enter_bitbang(self.serial):
+                break
+        else:
+            raise CommandError("Lost the Bus Pirate while changing the link speed.")
+        self._reenter()
+        self.timer.baud_rate = rate
+        log.info(f"Host link running at {rate} baud.")
+        if port:
+            DiscoveryCache().update(port, baud_rate=rate if hardware == "v4" else None)
+        return rate
+
+    def record(self, path: str):
+        """Start recording all traffic on the open connection to `path`.
+
+        To also capture the initial reset handshake, wrap the serial port before handing it to
+        the mode instead: `I2C(RecordingSerial(serial.Serial(...), path))`.
+        """
+        from yabp.recorder import RecordingSerial
+
+        recorder = RecordingSerial(self.serial, path)
+        self.serial = cast(serial.Serial, recorder)  # Everything else is passed through.
+        return recorder
+
+    def trace(self, tracer=None):
+        """Start tracing calls to this mode and the serial traffic under them.
+
+        Returns the `yabp.trace.Tracer`, a new one unless one is given so that devices and
+        other modes can share it.  Call its `save()` when done.
+        """
+        from yabp.trace import Tracer, TracingSerial
+
+        tracer = tracer or Tracer()
+        tracer.attach(self, "mode")
+        self.serial = TracingSerial(self.serial, tracer)
+        return tracer
+
+    def resume(self) -> None:
+        """Re-enter this mode after the connection was used by another mode.
+
+        Only the exit to BBIO and the mode's own entry command are sent, followed by whichever
+        cached settings differ from what the Bus Pirate resets them to on entering the mode.
+        """
+        self._set_mode(b"BBIO1")
+        self._reenter()
+
+    def resync(self, drain_time: float = 0.25, max_stray: int = 65536) -> int:
+        """Recover from a failed command without reopening the port, returning the stray bytes.
+
+        A 0x00 is sent first, which stops continuous ADC readings, a sniffer or UART echo left
+        running.  Whatever is still arriving is drained and counted for at most `drain_time`
+        seconds or `max_stray` bytes, then the Bus Pirate is sent back to BBIO and into this
+        mode again with the cached configuration restored.
+
+        The 0x00s sent to reach BBIO also fill in the arguments of a command the Bus Pirate was
+        still waiting on, but only around 20 of them are sent.  A command missing more bytes
+        than that, e.g. a write then read cut short with thousands of bytes left to write, is
+        not completed and CommandError is raised; reopen the port in that case.
+        """
+        self.serial.write(b"\x00")
+        previous_timeout = self.serial.timeout
+        self.serial.timeout = self.timer.deadline(1)
+        stray = 0
+        end = time.monotonic() + drain_time
+        try:
+            while stray < max_stray and time.monotonic() < end:
+                chunk = self.serial.read(min(max(1, self.serial.in_waiting), max_stray - stray))
+                if not chunk:
+                    break
+                stray += len(chunk)
+        finally:
+            self.serial.timeout = previous_timeout
+        if not enter_bitbang(self.serial):
+            raise CommandError("Failed to resynchronise with the Bus Pirate.")
+        self._reenter()
+        log.info(f"Resynchronised with the Bus Pirate, discarded {stray} stray bytes.")
+        return stray
+
+    def retry(self, transaction: Callable[[], T], attempts: int = 2) -> T:
+        """Run `transaction`, resyncing and running it again each time it raises CommandError.
+
+        ```python
+        value = bp.retry(lambda: bp.read_register(0x20, 0x12))
+        ```
+        """
+        if attempts < 1:
+            raise ValueError(f"{attempts} is not a valid number of attempts.")
+        for _ in range(attempts - 1):
+            try:
+                return transaction()
+            except CommandError as error:
+                log.warning(f"{error} Resyncing and trying again.")
+                self.resync()
+        return transaction()
+
+    def _reenter(self) -> None:
+        """Enter this mode from BBIO and restore the cached configuration."""
+        if self.MODE != b"BBIO1":
+            self._set_mode(self.MODE)
+        self._restore_config()
+
+    def _restore_config(self) -> None:
+        """Send the cached configuration shadows and speed that differ from the defaults."""
+        for name, power_on_value in self._POWER_ON_CONFIG.items():
+            value = getattr(self, name)
+            if value != power_on_value:
+                self.command(bytes([value]))
+        if self._speed is not None:
+            self.command(bytes([0x60 | self._speed]))
+
     def close(self) -> None:
         """Free the serial port."""
         self._set_mode(b"BBIO1")
@@ -81,10 +263,10 @@ class AbstractBusPirateMode(ABC):
         """Change the mode of the bus pirate."""
         self.serial.reset_input_buffer()
         self.serial.write(self._MODES[mode])
-        returned_name = self.serial.read(len(mode))
+        returned_name = self._read(len(mode))
         self.serial.reset_input_buffer()
         if mode != returned_name:
-            CommandError("Failed to change modes.")
+            raise CommandError(f"Failed to change modes. Returned: {returned_name!r}")
         log.debug("Current Mode - {}".format(mode.decode()))
 
     def _reset_bus_pirate(self) -> None:
@@ -100,7 +282,7 @@ class AbstractBusPirateMode(ABC):
         """Return the current version of the mode."""
         self.serial.reset_input_buffer()
         self.serial.write(b"\x01")
-        version = self.serial.read(4)
+        version = self._read(4)
         return version.decode()
 
     def send(self, data: Union[int, List]):
@@ -125,7 +307,7 @@ class AbstractBusPirateMode(ABC):
         self.is_successful()
         for data_to_send in data:
             self.serial.write(bytes([data_to_send]))
-        return self.serial.read(len(data))
+        return self._read(len(data), bus_bytes=len(data))
 
     def command(self, command: bytes):
         """Write the command to the bus pirate and make sure the command succeeded."""
@@ -135,10 +317,30 @@ class AbstractBusPirateMode(ABC):
 
     def is_successful(self) -> None:
         r"""Whenever the bus pirate successfully completes a command, it returns b"\x01"."""
-        status = self.serial.read(1)
+        status = self._read(1)
         if status != b"\x01":
             raise CommandError(f"Bus Pirate did not acknowledge command. Returned: {status}")
 
+    def _read(self, size: int, bus_bytes: int = 0, link_bytes: Optional[int] = None) -> bytes:
+        """Read a reply of `size` bytes with a deadline sized for it.
+
+        `bus_bytes` is how many bytes the Bus Pirate has to clock over the target bus before the
+        reply is complete.  `link_bytes` is how many bytes have to cross the host link, by
+        default the reply itself, but more when command bytes are still on their way to the Bus
+        Pirate.  See `yabp.timing.ReplyTimer`.
+        """
+        link_bytes = size if link_bytes is None else link_bytes
+        timeout = self.timer.deadline(link_bytes, bus_bytes)
+        if self.serial.timeout != timeout:
+            self.serial.timeout = timeout
+        start = time.perf_counter()
+        reply = self.serial.read(size)
+        if len(reply) == size:
+            self.timer.learn(time.perf_counter() - start, link_bytes, bus_bytes)
+        else:
+            self.timer.back_off()
+        return reply
+
     def is_alive(self) -> bool:
         """Return the serial port."""
         return self.serial.is_open
@@ -198,8 +400,32 @@ def get_serial_port() -> str:
 
     The bus pirate v3 has a vendor id of 0403 and the documentation of the v4 lists 04D8 as the id.
     """
+    import serial.tools.list_ports  # Only needed when searching so keep it out of import time.
+
     potential_ports = serial.tools.list_ports.comports(include_links=True)
     for port in potential_ports:
         if any(vid in port.hwid for vid in ["0403", "04D8"]):
+            DiscoveryCache().update(port.device, hwid=port.hwid)
             return port.device
     raise ConnectionError("Failed to find Bus Pirate")
+
+
+def enter_bitbang(serial_port, tries: int = 20, timeout: Optional[float] = None) -> bool:
+    """Send 0x00 until the Bus Pirate answers BBIO1, up to `tries` times.
+
+    From the terminal it takes 20 in a row to enter the binary mode, from any of the binary modes
+    a single 0x00 returns to BBIO.  `timeout` temporarily overrides the port's read timeout.
+    """
+    previous_timeout = serial_port.timeout
+    if timeout is not None:
+        serial_port.timeout = timeout
+    try:
+        serial_port.reset_input_buffer()
+        for _ in range(0, tries):
+            serial_port.write(b"\x00")
+            if b"BBIO" in serial_port.read(5):
+                serial_port.reset_input_buffer()
+                return True
+        return False
+    finally:
+        serial_port.timeout = previous_timeout
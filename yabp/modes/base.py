@@ -1,55 +1,225 @@
 """Base Mode of the Bus Pirate."""
+import functools
 import logging
-from typing import Union
+import struct
+from typing import Iterable, NamedTuple, Optional, Union
 
-from yabp.modes.abstract_mode import AbstractBusPirateMode
+from yabp.exceptions import CommandError
+from yabp.modes.abstract_mode import AbstractBusPirateMode, SerialLike
 
 log = logging.getLogger("yabp.base")
 
+ADC_SCALE = 3.3 * 2 / 1024  # 10 bit ADC at 3.3V behind a 1/2 voltage divider.
+PWM_OSCILLATOR = 32_000_000  # 32 MHz, one instruction cycle every two clocks.
+PWM_PRESCALERS = (1, 8, 64, 256)  # Config byte 1 of the PWM command selects one by index.
+_PWM_FRAME = struct.Struct(">BBHH")  # 0x12, prescaler, duty (OCR), period (PR)
+
+
+class PWMSetting(NamedTuple):
+    """The register values of the PWM command (0x12)."""
+
+    prescaler: int  # Index into PWM_PRESCALERS.
+    period_register: int
+    duty_register: int
+
+    @property
+    def period(self) -> float:
+        """Return the period in seconds these registers produce."""
+        cycle = 2 / PWM_OSCILLATOR * PWM_PRESCALERS[self.prescaler]
+        return (self.period_register + 1) * cycle
+
+    @property
+    def duty_cycle(self) -> float:
+        """Return the duty cycle these registers produce, 0 to 1."""
+        return self.duty_register / self.period_register
+
+    def frame(self) -> bytes:
+        """Return the PWM command for these registers."""
+        return _PWM_FRAME.pack(0x12, self.prescaler, self.duty_register, self.period_register)
+
+
+@functools.lru_cache(maxsize=1024)
+def solve_pwm(period: float, duty_cycle: float, prescaler: Optional[int] = None) -> PWMSetting:
+    """Work out the PWM registers for a period in seconds and a duty cycle from 0 to 1.
+
+    PR = period / (Tcy * prescaler) - 1, with Tcy = 2 / 32MHz, and OCR = PR * duty cycle.
+    Unless a `prescaler` index is given, the smallest prescaler whose period register fits in
+    16 bits is used, as that gives the finest duty cycle resolution.  Solutions are cached so
+    repeating a setting costs a dictionary lookup.
+
+    Raises ValueError if the period can't be produced.
+    """
+    if not 0 <= duty_cycle <= 1:
+        raise ValueError(f"{duty_cycle} is not a valid duty cycle, it must be 0 to 1.")
+    candidates = range(len(PWM_PRESCALERS)) if prescaler is None else [prescaler]
+    for index in candidates:
+        if index not in range(len(PWM_PRESCALERS)):
+            raise ValueError(f"{index} is not a valid prescaler setting.")
+        period_register = round(period / (2 / PWM_OSCILLATOR * PWM_PRESCALERS[index])) - 1
+        if 1 <= period_register <= 0xFFFF:
+            return PWMSetting(index, period_register, int(period_register * duty_cycle))
+    raise ValueError(f"A PWM period of {period}s is out of range.")
+
 
 class Base(AbstractBusPirateMode):
     """Base Mode of the Bus Pirate."""
 
+    _POWER_ON_CONFIG = {"_config_peripherals": 0x80, "_config_pin_direction": 0x5F}
+    PINS = ("AUX", "MOSI", "CLK", "MISO", "CS")  # Bits 4 to 0 of the pin commands.
+
     def __init__(
-        self, port: Union[str, None] = None, baud_rate: int = 115200, timeout: float = 0.1
+        self,
+        port: Union[str, SerialLike, None] = None,
+        baud_rate: int = 115200,
+        timeout: float = 0.1,
     ):
         super().__init__(port, baud_rate, timeout)
         self._config_peripherals = 0x80  # POWER|PULLUP|AUX|MOSI|CLK|MISO|CS
         self._config_pin_direction = 0x5F  # AUX|MOSI|CLK|MISO|CS
+        # AUX|MOSI|CLK|MISO|CS levels returned by the last pin command.
+        self.pin_state: Optional[int] = None
+        self.pwm: Optional[PWMSetting] = None  # The PWM registers last sent.
+
+    def measure_voltage(self) -> float:
+        """Take a single measurement of the voltage probe (ADC) pin.
+
+        The Bus Pirate replies to 0x14 with the 10 bit ADC reading, high byte first.  The probe
+        has a 1/2 voltage divider in front of the 3.3V ADC so the full scale is 6.6V.
+        """
+        self.serial.reset_input_buffer()
+        self.serial.write(b"\x14")
+        reading = self._read(2)
+        if len(reading) != 2:
+            raise CommandError(f"Bus Pirate did not return an ADC reading. Returned: {reading!r}")
+        return int.from_bytes(reading, "big") * ADC_SCALE
+
+    def stream_voltage(self, capacity: int = 65536, start: bool = True):
+        """Continuously measure the voltage probe pin on a background thread.
+
+        Returns a `yabp.streaming.VoltageStream` holding at most `capacity` of the most recent
+        samples.  Nothing else can be sent to the Bus Pirate until the stream is stopped.
+        Requires numpy.
+        """
+        from yabp.streaming import VoltageStream
+
+        stream = VoltageStream(self, capacity)
+        if start:
+            stream.start()
+        return stream
+
+    def read_pins(self) -> int:
+        """Return the levels of the AUX|MOSI|CLK|MISO|CS pins (bits 4 to 0).
+
+        The pin directions are sent again unchanged, which does nothing but return the levels.
+        """
+        return self._pin_command(self._config_pin_direction)
+
+    def sample_pins(self, count: int, burst: int = 1024):
+        """Sample the pin levels `count` times as fast as the host link allows.
+
+        Returns a `yabp.streaming.LogicSamples` with a bit plane and host timestamp per sample.
+        Requires numpy.
+        """
+        from yabp.streaming import sample_pins
+
+        return sample_pins(self, count, burst)
+
+    def _pin_command(self, command: int) -> int:
+        """Send a pin direction (010xxxxx) or state (1xxxxxxx) command.
+
+        Rather than 0x01, the Bus Pirate replies to both with the pin levels, which are kept in
+        `pin_state` and returned.
+        """
+        self.serial.reset_input_buffer()
+        self.serial.write(bytes([command]))
+        reply = self._read(1)
+        if len(reply) != 1:
+            raise CommandError("Bus Pirate did not reply to the pin command.")
+        levels = reply[0] & 0x1F
+        self.pin_state = levels
+        return levels
+
+    def _write_config(self) -> None:
+        """Update the pin state register.
+
+        Register Format: (1xxxxxxx) POWER|PULLUP|AUX|MOSI|CLK|MISO|CS
+        """
+        self._pin_command(self._config_peripherals)
+
+    def _restore_config(self) -> None:
+        """Send the pin states and directions again if they differ from the defaults."""
+        if self._config_peripherals != self._POWER_ON_CONFIG["_config_peripherals"]:
+            self._write_config()
+        if self._config_pin_direction != self._POWER_ON_CONFIG["_config_pin_direction"]:
+            self._write_pin_direction()
 
     def disable_pwm(self) -> None:
         """Clear and Disable the pwm configuration."""
         self.command(b"\x13")
+        self.pwm = None
 
-    def configure_pwm(self, period: int, duty_cycle: float, prescaler: int = 0) -> None:
+    def configure_pwm(
+        self, period: float, duty_cycle: float, prescaler: Optional[int] = None
+    ) -> PWMSetting:
         """Configure the PWM on the bus pirate's AUX pin.
 
         Args:
         ----
-            period: pwm period in miliseconds (1e-3 == 0.1msec)
+            period: pwm period in seconds (1e-3 == 1msec)
             duty_cycle: 0 to 1 (.5 == 50% Duty Cycle)
-            prescaler: 0: x1, 1: x8, 2: x64, 3: x256
+            prescaler: 0: x1, 1: x8, 2: x64, 3: x256 or None to pick the finest resolution
+
+        Nothing is sent if the registers are the same as last time.  Returns the registers so
+        the period and duty cycle actually produced can be checked.
 
         """
-        crystal_frequency = 32_000_000  # 32 MHz
-
-        system_clock = 2.0 / crystal_frequency
-        period_register = period / (system_clock * prescaler)
-        period_register = period_register - 1
-        output_compare_register = period_register * duty_cycle
-
-        self.command(
-            bytes(
-                [
-                    0x12,  # Setup PWM Command
-                    prescaler,  # Config Byte 1
-                    ((int(output_compare_register) >> 8) & 0xFF),  # Config Byte 2
-                    (int(output_compare_register) & 0xFF),  # Config Byte 3
-                    ((int(period_register) >> 8) & 0xFF),  # Config Byte 4
-                    (int(period_register) & 0xFF),  # Config Byte 5
-                ]
+        setting = solve_pwm(period, duty_cycle, prescaler)
+        self._write_pwm(setting)
+        return setting
+
+    def set_pwm_duty(self, duty_cycle: float) -> PWMSetting:
+        """Change only the duty cycle, keeping the configured period and prescaler."""
+        if self.pwm is None:
+            raise ValueError("Configure the PWM before changing its duty cycle.")
+        if not 0 <= duty_cycle <= 1:
+            raise ValueError(f"{duty_cycle} is not a valid duty cycle, it must be 0 to 1.")
+        setting = self.pwm._replace(duty_register=int(self.pwm.period_register * duty_cycle))
+        self._write_pwm(setting)
+        return setting
+
+    def sweep_pwm_duty(self, duty_cycles: Iterable[float], chunk_size: int = 256) -> int:
+        """Step through a sequence of duty cycles as fast as the host link allows.
+
+        The commands for up to `chunk_size` steps go out in one write and their replies are read
+        back together.  `pwm` follows the last acknowledged step, also when a later one fails.
+        Returns the number of steps sent.
+        """
+        if self.pwm is None:
+            raise ValueError("Configure the PWM before sweeping its duty cycle.")
+        duty_cycles = list(duty_cycles)
+        if not all(0 <= duty <= 1 for duty in duty_cycles):
+            raise ValueError("Every duty cycle of a sweep must be 0 to 1.")
+        prescaler, period_register, _ = self.pwm
+        duty_registers = [int(period_register * duty) for duty in duty_cycles]
+        self.serial.reset_input_buffer()
+        for offset in range(0, len(duty_registers), chunk_size):
+            chunk = duty_registers[offset : offset + chunk_size]
+            self.serial.write(
+                b"".join(_PWM_FRAME.pack(0x12, prescaler, duty, period_register) for duty in chunk)
             )
-        )
+            replies = self._read(len(chunk), link_bytes=len(chunk) * (_PWM_FRAME.size + 1))
+            acknowledged = len(replies) - len(replies.lstrip(b"\x01"))
+            if acknowledged:
+                self.pwm = PWMSetting(prescaler, period_register, chunk[acknowledged - 1])
+            if acknowledged != len(chunk):
+                raise CommandError(f"Bus Pirate did not acknowledge the PWM sweep: {replies!r}")
+        return len(duty_registers)
+
+    def _write_pwm(self, setting: PWMSetting) -> None:
+        """Send the PWM registers unless they are already set."""
+        if setting != self.pwm:
+            self.command(setting.frame())
+            self.pwm = setting
 
     def pullups(self, enable=False) -> None:
         """Enable or Disable the pull-ups."""
@@ -126,7 +296,7 @@ class Base(AbstractBusPirateMode):
 
         Register Format: (010xxxxx) AUX|MOSI|CLK|MISO|CS
         """
-        self.command(bytes([self._config_pin_direction]))
+        self._pin_command(self._config_pin_direction)
 
     def set_aux_direction(self, output=False) -> None:
         """Set the aux pin direction to either an input (1) or output (0)."""
@@ -1,8 +1,10 @@
 """I2C Mode of the Bus Pirate."""
 import logging
-from typing import List, Union
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
 
-from yabp.modes.abstract_mode import AbstractBusPirateMode
+from yabp.exceptions import CommandError, DeviceError
+from yabp.modes.abstract_mode import AbstractBusPirateMode, SerialLike
 
 log = logging.getLogger("yabp.i2c")
 
@@ -10,11 +12,20 @@ log = logging.getLogger("yabp.i2c")
 class I2C(AbstractBusPirateMode):
     """I2C Mode of the Bus Pirate."""
 
+    MODE = b"I2C1"
+    SPEEDS = {0: 5_000, 1: 50_000, 2: 100_000, 3: 400_000}
+    MAX_WRITE_THEN_READ = 4096
+
     def __init__(
-        self, port: Union[str, None] = None, baud_rate: int = 115200, timeout: float = 0.1
+        self,
+        port: Union[str, SerialLike, None] = None,
+        baud_rate: int = 115200,
+        timeout: float = 0.1,
     ):
         super().__init__(port, baud_rate, timeout)
-        self._set_mode(b"I2C1")
+        self._set_mode(self.MODE)
+        self._speed: Optional[int] = None
+        self.timer.set_bus_rate(self.SPEEDS[0], bits_per_byte=9)  # Assume the slowest until set.
 
     def start(self) -> None:
         """Send a start bit."""
@@ -38,16 +49,18 @@ class I2C(AbstractBusPirateMode):
         You must call ack() or nack() afterwards.
         """
         self.serial.write(b"\x04")
-        return self.serial.read(1)
+        return self._read(1, bus_bytes=1)
 
     def set_speed(self, speed: int = 2) -> None:
         """Set the I2C Bus rate.
 
         Valid Settings: 0: 5kHz, 1: 50kHz, 2: 100Khz, 3: 400kHz
         """
-        if speed < 1 or speed > 3:
+        if speed < 1 or speed not in self.SPEEDS:
             raise ValueError(f"{speed} is not a valid i2c speed setting.")
         self.command(bytes([0x60 | speed]))
+        self._speed = speed
+        self.timer.set_bus_rate(self.SPEEDS[speed], bits_per_byte=9)
 
     def write(self, address: int, data: Union[int, List]) -> None:
         """Write to an I2C device.
@@ -77,6 +90,120 @@ class I2C(AbstractBusPirateMode):
         self.stop()
         return response.decode()
 
+    def write_then_read(self, data: Union[bytes, List[int]], read_count: int = 0) -> bytes:
+        """Write and then read in a single command (0x08).
+
+        The Bus Pirate sends a start and every byte of `data`, the first of which must be the
+        address byte.  If `read_count` is not zero it then sends a restart with the read address
+        (the first byte + 1), reads `read_count` bytes, ACKing all but the last, and finally
+        sends the stop.  Up to 4096 bytes can be written and read.
+
+        Raises DeviceError if any written byte was NACKed and CommandError if the reply never
+        arrived in full.
+        """
+        self.serial.write(self._write_then_read_frame(data, read_count))
+        return self._write_then_read_reply(len(data), read_count)
+
+    def write_then_read_burst(
+        self, commands: Sequence[Tuple[Union[bytes, List[int]], int]], max_in_flight: int = 1
+    ) -> Iterator[Optional[bytes]]:
+        """Run several write then read commands back to back, yielding each one's data in turn.
+
+        `commands` holds the `data` and `read_count` of each command.  Up to `max_in_flight`
+        commands are written before waiting on the oldest reply, so the Bus Pirate can move
+        straight on to the next one.  None is yielded for a command the device NACKed.  The Bus
+        Pirate's UART only buffers 4 received bytes and has no flow control, so only go past 1
+        when the host link is flow controlled, such as the v4's USB CDC port.
+
+        If a reply comes back short the replies to the commands still in flight can't be told
+        apart any more, so they are dropped, the mode is resynced and CommandError is raised.
+        """
+        frames = [self._write_then_read_frame(data, read_count) for data, read_count in commands]
+        in_flight: deque = deque()
+        try:
+            for frame, (data, read_count) in zip(frames, commands):
+                self.serial.write(frame)
+                in_flight.append((len(data), read_count))
+                if len(in_flight) >= max_in_flight:
+                    yield self._burst_reply(*in_flight.popleft())
+            while in_flight:
+                yield self._burst_reply(*in_flight.popleft())
+        except CommandError:
+            log.warning(f"Lost the reply stream, dropping {len(in_flight)} commands in flight.")
+            self.resync()
+            raise
+
+    def _burst_reply(self, write_count: int, read_count: int) -> Optional[bytes]:
+        try:
+            return self._write_then_read_reply(write_count, read_count)
+        except DeviceError:
+            return None
+
+    def _write_then_read_frame(self, data: Union[bytes, List[int]], read_count: int) -> bytes:
+        """Build the bytes of a write then read command."""
+        if not data:
+            raise ValueError("Must write at least the address byte.")
+        if len(data) > self.MAX_WRITE_THEN_READ or read_count > self.MAX_WRITE_THEN_READ:
+            raise ValueError(
+                f"Can only write and read {self.MAX_WRITE_THEN_READ} bytes at a time. "
+                f"{len(data)} and {read_count} were attempted."
+            )
+        return b"\x08" + len(data).to_bytes(2, "big") + read_count.to_bytes(2, "big") + bytes(data)
+
+    def _write_then_read_reply(self, write_count: int, read_count: int) -> bytes:
+        """Read the status and data returned by a write then read command.
+
+        The status can't arrive before the whole command has crossed the host link, which for
+        a long write takes far longer than the status byte itself.
+        """
+        bus_bytes = write_count + read_count + (1 if read_count else 0)
+        link_bytes = 5 + write_count + 1  # 0x08, both counts and the data, then the status.
+        status = self._read(1, bus_bytes=bus_bytes, link_bytes=link_bytes)
+        if not status:
+            raise CommandError("Bus Pirate did not reply to the write then read command.")
+        if status != b"\x01":
+            raise DeviceError(f"I2C device did not acknowledge the write. Returned: {status!r}")
+        data = self._read(read_count) if read_count else b""
+        if len(data) != read_count:
+            raise CommandError(f"Only {len(data)} of {read_count} bytes were read.")
+        return data
+
+    def snapshot(
+        self, address: Union[int, Iterable[int]], start: int = 0, length: int = 256
+    ) -> Union[bytes, Dict[int, Optional[bytes]]]:
+        """Read `length` registers from `start` with sequential reads.
+
+        The register address is written once and the device's auto increment does the rest, so
+        the whole register space takes a single write then read command.  Given several
+        addresses, returns a dict of snapshots keyed by address, with None for any device that
+        didn't acknowledge.  See `yabp.snapshot` for diffing them and keeping a history.
+        """
+        if start < 0 or length < 1 or start + length > 256:
+            raise ValueError(f"{start}+{length} is outside of the 256 register address space.")
+        if isinstance(address, int):
+            return self.write_then_read([address << 1, start], length)
+        snapshots: Dict[int, Optional[bytes]] = {}
+        for each in address:
+            try:
+                snapshots[each] = self.write_then_read([each << 1, start], length)
+            except DeviceError:
+                log.warning(f"{each:#x} did not acknowledge the snapshot.")
+                snapshots[each] = None
+        return snapshots
+
+    def sniff(self, capacity: int = 65536, log_path: Optional[str] = None, start: bool = True):
+        """Watch the traffic of other masters on the bus with the I2C sniffer (0x0F).
+
+        Returns a `yabp.sniffer.Sniffer` yielding `yabp.sniffer.I2CTransaction`s.  Nothing else
+        can be sent to the Bus Pirate until it is stopped.  Requires numpy.
+        """
+        from yabp.sniffer import I2CDecoder, Sniffer
+
+        sniffer = Sniffer(self, b"\x0f", I2CDecoder(), capacity, log_path)
+        if start:
+            sniffer.start()
+        return sniffer
+
     def write_register(self, address: int, register: int, data: int) -> None:
         """Write to an I2C device's register.
 
@@ -1,8 +1,10 @@
 """SPI Mode of the Bus Pirate."""
 import logging
-from typing import Union
+from collections import deque
+from typing import Optional, Union
 
-from yabp.modes.abstract_mode import AbstractBusPirateMode
+from yabp.exceptions import CommandError
+from yabp.modes.abstract_mode import AbstractBusPirateMode, SerialLike
 
 log = logging.getLogger("yabp.spi")
 
@@ -10,11 +12,29 @@ log = logging.getLogger("yabp.spi")
 class SPI(AbstractBusPirateMode):
     """SPI Mode of the Bus Pirate."""
 
+    MODE = b"SPI1"
+    SPEEDS = {
+        0: 30_000,
+        1: 125_000,
+        2: 250_000,
+        3: 1_000_000,
+        4: 2_000_000,
+        5: 2_600_000,
+        6: 4_000_000,
+        7: 8_000_000,
+    }
+    _POWER_ON_CONFIG = {"_config_peripherals": 0x40, "_config_spi": 0x82}
+
     def __init__(
-        self, port: Union[str, None] = None, baud_rate: int = 115200, timeout: float = 0.1
+        self,
+        port: Union[str, SerialLike, None] = None,
+        baud_rate: int = 115200,
+        timeout: float = 0.1,
     ):
         super().__init__(port, baud_rate, timeout)
-        self._set_mode(b"SPI1")
+        self._set_mode(self.MODE)
+        self._speed: Optional[int] = None
+        self.timer.set_bus_rate(self.SPEEDS[0])  # Power on default of 30kHz.
 
         # Pin output HiZ, CKP Idle = Low, CKE Edge = Active to Idle (1), Sample Middle
         self._config_spi = 0x82
@@ -32,9 +52,11 @@ class SPI(AbstractBusPirateMode):
             6: 4MHz
             7: 8MHz
         """
-        if speed < 0 or speed > 7:
+        if speed not in self.SPEEDS:
             raise ValueError(f"{speed} is not a valid baud rate setting.")
         self.command(bytes([0x60 | speed]))
+        self._speed = speed
+        self.timer.set_bus_rate(self.SPEEDS[speed])
 
     def output_state(self, high: bool = False) -> None:
         """Set the pin output to HiZ or 3.3V."""
@@ -86,6 +108,69 @@ class SPI(AbstractBusPirateMode):
             log.info("Sample Data at Middle of Pulse.")
         self._write_config()
 
+    def exchange(self, tx_buffer, rx_buffer=None, max_in_flight: int = 1):
+        """Clock out `tx_buffer` while storing what is clocked in, with chip select held low.
+
+        Both buffers may be any object supporting the buffer protocol (bytes, bytearray, array,
+        NumPy arrays, ...) and are treated as raw bytes.  `rx_buffer` is filled in place and
+        must be writable and at least as long as `tx_buffer`; a new bytearray is returned if it
+        isn't given.
+
+        The data goes out as 16 byte bulk transfer frames.  Up to `max_in_flight` frames are
+        written before waiting on their replies so the link never sits idle between frames.
+        It defaults to 1: the Bus Pirate's UART only buffers 4 received bytes and has no flow
+        control, so a frame arriving while the last one is still being clocked out is lost.
+        Only raise it when the host link is flow controlled, such as the v4's USB CDC port.
+        """
+        tx = memoryview(tx_buffer).cast("B")
+        if rx_buffer is None:
+            rx_buffer = bytearray(len(tx))
+        rx = memoryview(rx_buffer).cast("B")
+        if len(rx) < len(tx):
+            raise ValueError(f"rx_buffer holds {len(rx)} bytes but {len(tx)} will be received.")
+
+        in_flight: deque = deque()
+        self.set_chip_select(high=False)
+        try:
+            for offset in range(0, len(tx), 16):
+                chunk = tx[offset : offset + 16]
+                self.serial.write(bytes([0x10 | len(chunk) - 1]) + chunk)
+                in_flight.append((offset, len(chunk)))
+                if len(in_flight) >= max_in_flight:
+                    self._receive_frame(rx, *in_flight.popleft())
+            while in_flight:
+                self._receive_frame(rx, *in_flight.popleft())
+        finally:
+            self.set_chip_select(high=True)
+        return rx_buffer
+
+    def sniff(
+        self,
+        chip_select_only: bool = True,
+        capacity: int = 65536,
+        log_path: Optional[str] = None,
+        start: bool = True,
+    ):
+        """Watch the bus with the SPI sniffer, only while CS is low (0x0E) or always (0x0D).
+
+        Returns a `yabp.sniffer.Sniffer` yielding `yabp.sniffer.SPITransaction`s.  Nothing else
+        can be sent to the Bus Pirate until it is stopped.  Requires numpy.
+        """
+        from yabp.sniffer import Sniffer, SPIDecoder
+
+        command = b"\x0e" if chip_select_only else b"\x0d"
+        sniffer = Sniffer(self, command, SPIDecoder(), capacity, log_path)
+        if start:
+            sniffer.start()
+        return sniffer
+
+    def _receive_frame(self, rx: memoryview, offset: int, length: int) -> None:
+        """Read the reply to one bulk transfer frame into the receive buffer."""
+        reply = self._read(length + 1, bus_bytes=length)
+        if len(reply) != length + 1 or reply[0] != 0x01:
+            raise CommandError(f"Bus Pirate did not complete a bulk transfer. Returned: {reply!r}")
+        rx[offset : offset + length] = reply[1:]
+
     def _write_config(self) -> None:
         """Update the configuration register."""
         self.command(bytes([self._config_spi]))
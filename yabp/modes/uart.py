@@ -1,8 +1,8 @@
 """UART Mode of the Bus Pirate."""
 import logging
-from typing import Union
+from typing import Optional, Union
 
-from yabp.modes.abstract_mode import AbstractBusPirateMode
+from yabp.modes.abstract_mode import AbstractBusPirateMode, SerialLike
 
 log = logging.getLogger("yabp.uart")
 
@@ -10,11 +10,31 @@ log = logging.getLogger("yabp.uart")
 class UART(AbstractBusPirateMode):
     """UART Mode of the Bus Pirate."""
 
+    MODE = b"ART1"
+    SPEEDS = {
+        0: 300,
+        1: 1200,
+        2: 2400,
+        3: 4800,
+        4: 9600,
+        5: 19200,
+        6: 31250,
+        7: 38400,
+        8: 57600,
+        10: 115200,
+    }
+    _POWER_ON_CONFIG = {"_config_peripherals": 0x40, "_config_uart": 0x80}
+
     def __init__(
-        self, port: Union[str, None] = None, baud_rate: int = 115200, timeout: float = 0.1
+        self,
+        port: Union[str, SerialLike, None] = None,
+        baud_rate: int = 115200,
+        timeout: float = 0.1,
     ):
         super().__init__(port, baud_rate, timeout)
-        self._set_mode(b"ART1")
+        self._set_mode(self.MODE)
+        self._speed: Optional[int] = None
+        self.timer.set_bus_rate(self.SPEEDS[0], bits_per_byte=10)  # Power on default of 300.
         self._config_uart = 0x80  # HiZ, 8/N, 1 STOP, IDLE HIGH
 
     def enable_rx(self, enabled: bool = False):
@@ -49,9 +69,11 @@ class UART(AbstractBusPirateMode):
             8: 57600
             10: 115200
         """
-        if speed < 1 or speed > 10 or speed == 9:
+        if speed < 1 or speed not in self.SPEEDS:
             raise ValueError(f"{speed} is not a valid baud rate setting.")
         self.command(bytes([0x60 | speed]))
+        self._speed = speed
+        self.timer.set_bus_rate(self.SPEEDS[speed], bits_per_byte=10)
 
     def output_state(self, high: bool = False):
         """Set the pin output to HiZ or 3.3V."""
@@ -0,0 +1,189 @@
+"""Compile a fixed sequence of commands once and run it many times with new values.
+
+Building a `Plan` works out every byte to send, which bytes of the reply must hold which
+status or ACK values and where the data read sits in the reply.  The prepared plan then runs a
+whole transaction as one write and one read, with only the parameter slots patched in:
+
+```python
+plan = Plan(i2c)
+plan.start()
+plan.send(0x20 << 1, 0x12, plan.slot("gpioa"))
+plan.stop()
+write_gpioa = plan.prepare()
+
+plan = Plan(i2c)
+plan.write_then_read(0x20 << 1, plan.slot("register"), read=2, capture="ports")
+read_ports = plan.prepare()
+
+for value in range(256):
+    write_gpioa(gpioa=value)
+    ports = read_ports(register=0x12)["ports"]
+```
+
+The reply is checked against the expected bytes with one integer comparison.  Nothing is
+flushed before the write, so if an earlier error left stray bytes on the line, call the mode's
+`resync()` before running a plan again.
+"""
+import logging
+from typing import Callable, Dict, List, NamedTuple, Tuple, Union
+
+from yabp.exceptions import CommandError
+
+log = logging.getLogger("yabp.plan")
+
+
+class Slot(NamedTuple):
+    """A named parameter patched into the command bytes, big endian if wider than a byte."""
+
+    name: str
+    width: int = 1
+
+
+class Capture(NamedTuple):
+    """A slice of the reply returned under `name`, passed through `decode`."""
+
+    name: str
+    start: int
+    stop: int
+    decode: Callable[[bytes], object]
+
+
+class Plan:
+    """Record the commands of one transaction on a mode."""
+
+    def __init__(self, mode):
+        self.mode = mode
+        self.template = bytearray()
+        self.slots: List[Tuple[int, Slot]] = []  # Offset into the template and the slot.
+        self.expected = bytearray()  # The reply, with 0x00 where any value is accepted.
+        self.mask = bytearray()  # 0xFF for every reply byte that is checked.
+        self.captures: List[Capture] = []
+        self.bus_bytes = 0
+
+    def slot(self, name: str, width: int = 1) -> Slot:
+        """Return a parameter to use in place of a byte (or `width` bytes) of data."""
+        return Slot(name, width)
+
+    def _write(self, *data: Union[int, Slot]) -> int:
+        """Append command bytes and return how many data bytes they hold."""
+        count = 0
+        for value in data:
+            if isinstance(value, Slot):
+                self.slots.append((len(self.template), value))
+                self.template += bytes(value.width)
+                count += value.width
+            else:
+                self.template.append(value)
+                count += 1
+        return count
+
+    def _expect(self, reply: bytes) -> None:
+        self.expected += reply
+        self.mask += b"\xff" * len(reply)
+
+    def _capture(self, name: str, length: int, decode: Callable[[bytes], object]) -> None:
+        start = len(self.expected)
+        self.expected += bytes(length)
+        self.mask += bytes(length)
+        if name:
+            self.captures.append(Capture(name, start, start + length, decode))
+
+    def command(self, *data: Union[int, Slot]) -> None:
+        """Send a command the Bus Pirate acknowledges with 0x01, e.g. start or chip select."""
+        self._write(*data)
+        self._expect(b"\x01")
+
+    def start(self) -> None:
+        """Send an I2C start bit or SPI chip select low."""
+        self.command(0x02)
+
+    def stop(self) -> None:
+        """Send an I2C stop bit or SPI chip select high."""
+        self.command(0x03)
+
+    def send(self, *data: Union[int, Slot], capture: str = "", decode=bytes) -> None:
+        """Bulk transfer up to 16 bytes.
+
+        In I2C mode every byte must be ACKed.  In SPI mode the bytes clocked in can be returned
+        under `capture`.
+        """
+        length = sum(value.width if isinstance(value, Slot) else 1 for value in data)
+        if not 1 <= length <= 16:
+            raise ValueError(f"Can only send 1 to 16 bytes at a time. {length} was attempted.")
+        self._write(0x10 | length - 1)
+        self._expect(b"\x01")
+        self.bus_bytes += self._write(*data)
+        if self.mode.MODE == b"SPI1":
+            self._capture(capture, length, decode)
+        else:
+            self._expect((b"\x00" if self.mode.MODE == b"I2C1" else b"\x01") * length)
+
+    def read_byte(self, capture: str, ack: bool = False, decode=bytes) -> None:
+        """Read one I2C byte and ACK it, or NACK it if it's the last one."""
+        self._write(0x04)
+        self._capture(capture, 1, decode)
+        self.command(0x06 if ack else 0x07)
+        self.bus_bytes += 1
+
+    def write_then_read(
+        self, *data: Union[int, Slot], read: int = 0, capture: str = "", decode=bytes
+    ) -> None:
+        """Use the I2C write then read command (0x08), the first byte being the address."""
+        length = sum(value.width if isinstance(value, Slot) else 1 for value in data)
+        self._write(0x08, *length.to_bytes(2, "big"), *read.to_bytes(2, "big"))
+        self.bus_bytes += self._write(*data) + read
+        self._expect(b"\x01")
+        self._capture(capture, read, decode)
+
+    def prepare(self) -> "PreparedPlan":
+        """Freeze the plan into something that can be run."""
+        return PreparedPlan(self)
+
+
+class PreparedPlan:
+    """A compiled transaction, run by calling it with a value for every slot."""
+
+    def __init__(self, plan: Plan):
+        self.mode = plan.mode
+        self.buffer = bytearray(plan.template)
+        self.slots = [(offset, slot.name, slot.width) for offset, slot in plan.slots]
+        self.captures = plan.captures
+        self.reply_size = len(plan.expected)
+        self.bus_bytes = plan.bus_bytes
+        # The last reply byte can't arrive before the whole buffer has crossed the link.
+        self.link_bytes = len(self.buffer) + self.reply_size
+        self._mask = int.from_bytes(plan.mask, "big")
+        self._expected = int.from_bytes(plan.expected, "big")
+        self._expected_bytes = bytes(plan.expected)
+        self._mask_bytes = bytes(plan.mask)
+
+    def __call__(self, **values: int) -> Dict[str, object]:
+        """Patch the values in, run the transaction and return the captured replies."""
+        buffer = self.buffer
+        for offset, name, width in self.slots:
+            if width == 1:
+                buffer[offset] = values[name]
+            else:
+                buffer[offset : offset + width] = values[name].to_bytes(width, "big")
+        self.mode.serial.write(buffer)
+        reply = self.mode._read(
+            self.reply_size, bus_bytes=self.bus_bytes, link_bytes=self.link_bytes
+        )
+        if len(reply) != self.reply_size or (
+            int.from_bytes(reply, "big") & self._mask != self._expected
+        ):
+            raise CommandError(self._describe_failure(reply))
+        return {
+            capture.name: capture.decode(reply[capture.start : capture.stop])
+            for capture in self.captures
+        }
+
+    def _describe_failure(self, reply: bytes) -> str:
+        if len(reply) != self.reply_size:
+            return f"Expected a {self.reply_size} byte reply but got {len(reply)} bytes: {reply!r}"
+        for index, (value, expected, mask) in enumerate(
+            zip(reply, self._expected_bytes, self._mask_bytes)
+        ):
+            if value & mask != expected:
+                return f"Unexpected reply byte {index}: {value:#04x} instead of {expected:#04x}."
+        return "Unexpected reply."
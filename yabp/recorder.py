@@ -0,0 +1,223 @@
+"""Record the serial conversation with a Bus Pirate and replay it offline.
+
+A recording is an append-only binary file.  Each session starts with a header and is followed
+by one record per `write()` or `read()`:
+
+    header: b"YABPREC1" | wall clock start time (float64)
+    record: seconds since session start (float64) | direction (uint8) | length (uint32) | data
+
+All values are little endian.
+"""
+import logging
+import mmap
+import struct
+import time
+from typing import Iterator, List, NamedTuple
+
+from yabp.exceptions import CommandError
+
+log = logging.getLogger("yabp.recorder")
+
+MAGIC = b"YABPREC1"
+WRITE = 0
+READ = 1
+
+_HEADER = struct.Struct("<8sd")
+_RECORD = struct.Struct("<dBI")
+
+
+class Record(NamedTuple):
+    """A single write to or read from the Bus Pirate."""
+
+    timestamp: float
+    direction: int
+    data: bytes
+
+
+class RecordingSerial:
+    """Wrap a serial port and log every write and read to a recording file.
+
+    Records go through a large buffered writer so logging costs one `struct.pack` and one
+    in-memory copy per call.  The buffer is flushed to disk after every read, which ends each
+    round trip, and every `flush_every` records in between, so a crash loses at most the
+    commands written since the last reply.  Anything else is passed through to the wrapped port.
+    """
+
+    _OWN_ATTRIBUTES = ("serial", "path", "flush_every", "_file", "_start", "_unflushed")
+
+    def __init__(self, serial_port, path: str, buffer_size: int = 1 << 16, flush_every: int = 64):
+        self.serial = serial_port
+        self.path = path
+        self.flush_every = flush_every
+        self._file = open(path, "ab", buffering=buffer_size)
+        self._file.write(_HEADER.pack(MAGIC, time.time()))
+        self._file.flush()
+        self._start = time.perf_counter()
+        self._unflushed = 0
+        log.info(f"Recording Bus Pirate traffic to {path}")
+
+    def __getattr__(self, name):
+        return getattr(self.serial, name)
+
+    def __setattr__(self, name, value):
+        if name in self._OWN_ATTRIBUTES:
+            super().__setattr__(name, value)
+        else:
+            setattr(self.serial, name, value)
+
+    def _log(self, direction: int, data: bytes) -> None:
+        self._file.write(
+            _RECORD.pack(time.perf_counter() - self._start, direction, len(data)) + data
+        )
+        self._unflushed += 1
+        if self._unflushed >= self.flush_every:
+            self._flush_recording()
+
+    def _flush_recording(self) -> None:
+        self._file.flush()
+        self._unflushed = 0
+
+    def write(self, data) -> int:
+        """Write to the serial port and record what was sent."""
+        data = bytes(data)
+        self._log(WRITE, data)
+        return self.serial.write(data)
+
+    def read(self, size: int = 1) -> bytes:
+        """Read from the serial port and record what was received."""
+        data = self.serial.read(size)
+        self._log(READ, data)
+        self._flush_recording()
+        return data
+
+    def flush(self) -> None:
+        """Flush both the serial port and the recording."""
+        self.serial.flush()
+        self._flush_recording()
+
+    def stop(self):
+        """Stop recording and return the wrapped serial port."""
+        if not self._file.closed:
+            self._file.close()
+            log.info(f"Stopped recording to {self.path}")
+        return self.serial
+
+    def close(self) -> None:
+        """Close both the recording and the serial port."""
+        self.stop()
+        self.serial.close()
+
+
+def read_sessions(path: str) -> List[List[Record]]:
+    """Parse a recording file into a list of sessions, each a list of records.
+
+    A record cut short at the end of the file, e.g. by a crash while it was being written, is
+    ignored.
+    """
+    sessions: List[List[Record]] = []
+    with open(path, "rb") as recording:
+        if not recording.seek(0, 2):
+            return sessions
+        with mmap.mmap(recording.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            offset = 0
+            while offset < len(view):
+                if view[offset : offset + len(MAGIC)] == MAGIC:
+                    sessions.append([])
+                    offset += _HEADER.size
+                    continue
+                if not sessions:
+                    raise ValueError(f"{path} is not a yabp recording.")
+                if offset + _RECORD.size > len(view):
+                    break
+                timestamp, direction, length = _RECORD.unpack_from(view, offset)
+                offset += _RECORD.size
+                if offset + length > len(view):
+                    break
+                sessions[-1].append(Record(timestamp, direction, view[offset : offset + length]))
+                offset += length
+    return sessions
+
+
+class ReplaySerial:
+    """A serial-like object that serves the replies of a recorded session.
+
+    Every `write()` is checked against the recording and every `read()` returns the bytes that
+    were read at the same point in the original session.  By default the session runs as fast
+    as possible; with `realtime=True` each record waits for its original timestamp.
+    """
+
+    def __init__(self, path: str, session: int = 0, realtime: bool = False, strict: bool = True):
+        self.records: List[Record] = read_sessions(path)[session]
+        self.realtime = realtime
+        self.strict = strict
+        self.timeout = None
+        self.baudrate = None
+        self.is_open = True
+        self._index = 0
+        self._pending = b""
+        self._start = time.perf_counter()
+
+    def __iter__(self) -> Iterator[Record]:
+        return iter(self.records)
+
+    @property
+    def finished(self) -> bool:
+        """Return whether every record has been replayed."""
+        return self._index >= len(self.records) and not self._pending
+
+    @property
+    def in_waiting(self) -> int:
+        """Return the number of bytes the next `read()` calls could return."""
+        waiting = len(self._pending)
+        for record in self.records[self._index :]:
+            if record.direction != READ:
+                break
+            waiting += len(record.data)
+        return waiting
+
+    def _next(self) -> Record:
+        record = self.records[self._index]
+        self._index += 1
+        if self.realtime:
+            delay = record.timestamp - (time.perf_counter() - self._start)
+            if delay > 0:
+                time.sleep(delay)
+        return record
+
+    def write(self, data) -> int:
+        """Check the data against the next recorded write."""
+        data = bytes(data)
+        while self._index < len(self.records) and self.records[self._index].direction == READ:
+            self._index += 1  # The replies to the last command were never read.
+        self._pending = b""
+        if self._index >= len(self.records):
+            raise CommandError(f"Replay ran past the end of the recording writing {data!r}.")
+        record = self._next()
+        if self.strict and record.data != data:
+            raise CommandError(
+                f"Replay diverged at record {self._index - 1}: "
+                f"recorded {record.data!r}, written {data!r}."
+            )
+        return len(data)
+
+    def read(self, size: int = 1) -> bytes:
+        """Return the next recorded reply bytes."""
+        while len(self._pending) < size and self._index < len(self.records):
+            if self.records[self._index].direction != READ:
+                break
+            record = self._next()
+            self._pending += record.data
+            if not record.data:
+                break  # The original read timed out here.
+        data, self._pending = self._pending[:size], self._pending[size:]
+        return data
+
+    def reset_input_buffer(self) -> None:
+        """Do nothing as only the bytes that were actually read were recorded."""
+
+    def flush(self) -> None:
+        """Nothing is buffered on the way out."""
+
+    def close(self) -> None:
+        """Mark the replay closed."""
+        self.is_open = False
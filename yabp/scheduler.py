@@ -0,0 +1,211 @@
+"""Poll many I2C devices at their own rates on one bus.
+
+```python
+scheduler = PollingScheduler(yabp.I2C("COM3"))
+scheduler.add("temperature", 0x48, 0x00, length=2, period=0.1)
+scheduler.add("humidity", 0x40, 0xE5, length=2, period=1.0)
+for reading in scheduler.run(duration=10):
+    print(reading.name, reading.timestamp, reading.data)
+```
+
+Every job that is due at the same time is served by one burst of write then read commands.
+Jobs reading nearby registers of the same device are merged into a single sequential read, and
+the commands are written back to back with `I2C.write_then_read_burst()` so the Bus Pirate moves
+from one straight on to the next without waiting on a host round trip.
+"""
+import logging
+import math
+import queue
+import threading
+import time
+from typing import Dict, Iterator, List, NamedTuple, Optional
+
+from yabp.exceptions import CommandError
+
+log = logging.getLogger("yabp.scheduler")
+
+
+class Reading(NamedTuple):
+    """The result of one job run.  `data` is None if the device didn't acknowledge."""
+
+    name: str
+    address: int
+    register: int
+    data: Optional[bytes]
+    timestamp: float  # time.perf_counter() when the reply arrived.
+    late: float  # Seconds after the job was due.
+
+
+class Job:
+    """A register read repeated every `period` seconds."""
+
+    def __init__(self, name: str, address: int, register: int, length: int, period: float):
+        self.name = name
+        self.address = address
+        self.register = register
+        self.length = length
+        self.period = period
+        self.due = time.perf_counter()
+        self.count = 0
+        self.missed = 0  # Periods that passed without a reading.
+        self.errors = 0
+        self.total_late = 0.0
+        self.max_late = 0.0
+
+    @property
+    def end(self) -> int:
+        """Return the register after the last one read."""
+        return self.register + self.length
+
+    def finished(self, completed: float) -> float:
+        """Update the statistics for a run and schedule the next one, returning its lateness."""
+        late = completed - self.due
+        self.count += 1
+        self.total_late += late
+        self.max_late = max(self.max_late, late)
+        self.due += self.period
+        if completed >= self.due + self.period:
+            skipped = math.floor((completed - self.due) / self.period)
+            self.missed += skipped
+            self.due += skipped * self.period
+        return late
+
+
+class PollingScheduler:
+    """Run register read jobs on an `yabp.modes.i2c.I2C` at their target periods.
+
+    `merge_gap` is how many unwanted registers may sit between two jobs on the same device
+    before they are read separately.  `max_in_flight` limits how many commands are written
+    before waiting on replies.  It defaults to 1: the Bus Pirate's UART only buffers 4 received
+    bytes and has no flow control, so bytes arriving while it is busy on the bus are lost, and
+    a single write then read command is already longer than that.  Only raise it for adapters
+    whose link is flow controlled, such as the v4's USB CDC port.
+    """
+
+    def __init__(self, i2c, merge_gap: int = 4, max_in_flight: int = 1):
+        self.i2c = i2c
+        self.merge_gap = merge_gap
+        self.max_in_flight = max_in_flight
+        self.jobs: Dict[str, Job] = {}
+        self.results: queue.Queue = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._running = threading.Event()
+
+    def add(
+        self, name: str, address: int, register: int, length: int = 1, period: float = 0.1
+    ) -> Job:
+        """Read `length` bytes from `register` of the device at `address` every `period`."""
+        if period <= 0:
+            raise ValueError(f"{period} is not a valid period.")
+        self.jobs[name] = Job(name, address, register, length, period)
+        return self.jobs[name]
+
+    def remove(self, name: str) -> None:
+        """Stop running a job."""
+        del self.jobs[name]
+
+    def _batches(self, jobs: List[Job]) -> List[List[Job]]:
+        """Group jobs on the same device whose registers are close enough to read at once."""
+        batches: List[List[Job]] = []
+        for job in sorted(jobs, key=lambda job: (job.address, job.register)):
+            if batches:
+                last = batches[-1]
+                last_end = max(other.end for other in last)
+                if (
+                    job.address == last[0].address
+                    and job.register <= last_end + self.merge_gap
+                    and max(job.end, last_end) - last[0].register <= self.i2c.MAX_WRITE_THEN_READ
+                ):
+                    last.append(job)
+                    continue
+            batches.append([job])
+        return batches
+
+    def poll(self) -> List[Reading]:
+        """Run every job that is due now and return their readings.
+
+        If the reply stream is lost part way, the I2C mode is resynced and every batch without a
+        reply yet counts as an error.
+        """
+        now = time.perf_counter()
+        due = [job for job in self.jobs.values() if job.due <= now]
+        batches = self._batches(due)
+        commands = [
+            (
+                [batch[0].address << 1, batch[0].register],
+                max(job.end for job in batch) - batch[0].register,
+            )
+            for batch in batches
+        ]
+        readings: List[Reading] = []
+        done = 0
+        try:
+            for data in self.i2c.write_then_read_burst(commands, self.max_in_flight):
+                if data is None:
+                    log.debug(f"Polling {batches[done][0].address:#x} was not acknowledged.")
+                readings.extend(self._split(batches[done], data))
+                done += 1
+        except CommandError as error:
+            log.warning(f"Polling failed after {done} of {len(batches)} reads: {error}")
+            for batch in batches[done:]:
+                readings.extend(self._split(batch, None))
+        return readings
+
+    def _split(self, batch: List[Job], data: Optional[bytes]) -> List[Reading]:
+        """Split the data read for one batch between its jobs."""
+        completed = time.perf_counter()
+        readings = []
+        for job in batch:
+            if data is None:
+                job.errors += 1
+                value = None
+            else:
+                offset = job.register - batch[0].register
+                value = data[offset : offset + job.length]
+            late = job.finished(completed)
+            readings.append(Reading(job.name, job.address, job.register, value, completed, late))
+        return readings
+
+    def run(self, duration: Optional[float] = None) -> Iterator[Reading]:
+        """Run the jobs, yielding each reading, for `duration` seconds or until stopped."""
+        if self._thread is None:
+            self._running.set()
+        end = time.perf_counter() + duration if duration is not None else math.inf
+        while self._running.is_set() and self.jobs:
+            next_due = min(job.due for job in self.jobs.values())
+            if next_due >= end:
+                break
+            delay = next_due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            yield from self.poll()
+
+    def start(self) -> None:
+        """Run the jobs on a background thread, with readings arriving on `results`."""
+        self._running.set()
+        self._thread = threading.Thread(target=self._run_in_background, daemon=True)
+        self._thread.start()
+
+    def _run_in_background(self) -> None:
+        for reading in self.run():
+            self.results.put(reading)
+
+    def stop(self) -> None:
+        """Stop running the jobs after the current poll."""
+        self._running.clear()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def statistics(self) -> Dict[str, dict]:
+        """Return the run count, deadline misses, errors and lateness in seconds per job."""
+        return {
+            name: {
+                "count": job.count,
+                "missed": job.missed,
+                "errors": job.errors,
+                "mean_late": job.total_late / job.count if job.count else 0.0,
+                "max_late": job.max_late,
+            }
+            for name, job in self.jobs.items()
+        }
@@ -0,0 +1,109 @@
+r"""One connection to a Bus Pirate shared by all of its modes.
+
+Opening a mode directly resets the Bus Pirate and closing it resets it again, so going from
+I2C to SPI costs a port reopen and the full BBIO handshake.  A `BusPirate` opens the port once
+and hands out a view per mode; using a view switches the Bus Pirate to that mode with just the
+exit to BBIO and the mode's entry command:
+
+```python
+with BusPirate("COM3") as bp:
+    bp.i2c.set_speed(3)
+    bp.i2c.write_register(0x20, 0x00, 0xFF)
+    bp.spi.exchange(b"\x9f\x00\x00\x00")
+    bp.i2c.read_register(0x20, 0x12)  # Back in I2C at 400kHz.
+```
+"""
+import logging
+from typing import Dict, Union
+
+from yabp.modes.abstract_mode import AbstractBusPirateMode, SerialLike
+
+log = logging.getLogger("yabp.session")
+
+
+class BusPirate:
+    """Own the serial port and switch the Bus Pirate between modes on demand.
+
+    Each mode is created the first time it is used and kept for the life of the session, so its
+    configuration shadows (pull-ups, power, pin and bus configuration, speed) survive switching
+    to other modes and are sent again when switching back.
+    """
+
+    def __init__(
+        self,
+        port: Union[str, SerialLike, None] = None,
+        baud_rate: int = 115200,
+        timeout: float = 0.1,
+    ):
+        from yabp.modes.base import Base
+
+        self.timeout = timeout
+        self.current: AbstractBusPirateMode = Base(port, baud_rate, timeout)
+        self.serial = self.current.serial
+        self._modes: Dict[type, AbstractBusPirateMode] = {Base: self.current}
+
+    def __enter__(self):
+        """Allow using the session as a context manager."""
+        return self
+
+    def __exit__(self, *args):
+        """Reset the Bus Pirate and close the port."""
+        self.close()
+
+    @property
+    def base(self) -> "_ModeView":
+        """Return a view of the binary bitbang mode."""
+        from yabp.modes.base import Base
+
+        return _ModeView(self, Base)
+
+    @property
+    def i2c(self) -> "_ModeView":
+        """Return a view of I2C mode."""
+        from yabp.modes.i2c import I2C
+
+        return _ModeView(self, I2C)
+
+    @property
+    def spi(self) -> "_ModeView":
+        """Return a view of SPI mode."""
+        from yabp.modes.spi import SPI
+
+        return _ModeView(self, SPI)
+
+    @property
+    def uart(self) -> "_ModeView":
+        """Return a view of UART mode."""
+        from yabp.modes.uart import UART
+
+        return _ModeView(self, UART)
+
+    def switch(self, mode_class: type) -> AbstractBusPirateMode:
+        """Put the Bus Pirate in a mode and return that mode's object."""
+        mode = self._modes.get(mode_class)
+        if mode is self.current:
+            return mode
+        if mode is None:
+            # Handing a mode an open port only costs the exit to BBIO and the mode command.
+            mode = mode_class(self.serial, timeout=self.timeout)
+            self._modes[mode_class] = mode
+        else:
+            mode.resume()
+        log.debug(f"Switched from {type(self.current).__name__} to {mode_class.__name__}")
+        self.current = mode
+        return mode
+
+    def close(self) -> None:
+        """Reset the Bus Pirate to its terminal and close the port."""
+        self.current.close()
+
+
+class _ModeView:
+    """Forward attribute access to a mode, switching the Bus Pirate to it first."""
+
+    def __init__(self, session: BusPirate, mode_class: type):
+        self._session = session
+        self._mode_class = mode_class
+
+    def __getattr__(self, name):
+        return getattr(self._session.switch(self._mode_class), name)
@@ -0,0 +1,159 @@
+"""Share one Bus Pirate between threads.
+
+Every command relies on reading back exactly the replies to what was just written, and
+`command()` clears the input buffer first, so two threads talking at once corrupt each other's
+replies.  `SharedSession` serialises whole transactions behind a `PriorityLock` instead.
+"""
+import functools
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict
+
+HIGH = 0
+NORMAL = 10
+BULK = 20
+
+
+class WaitMetrics:
+    """How long transactions waited for the lock, grouped by priority."""
+
+    def __init__(self):
+        self.count: Dict[int, int] = {}
+        self.total: Dict[int, float] = {}
+        self.maximum: Dict[int, float] = {}
+
+    def record(self, priority: int, waited: float) -> None:
+        """Add one acquisition of the lock."""
+        self.count[priority] = self.count.get(priority, 0) + 1
+        self.total[priority] = self.total.get(priority, 0.0) + waited
+        self.maximum[priority] = max(self.maximum.get(priority, 0.0), waited)
+
+    def summary(self) -> Dict[int, dict]:
+        """Return the count, mean and maximum wait in seconds for each priority."""
+        return {
+            priority: {
+                "count": count,
+                "mean": self.total[priority] / count,
+                "max": self.maximum[priority],
+            }
+            for priority, count in sorted(self.count.items())
+        }
+
+
+class PriorityLock:
+    """A reentrant lock that is handed to waiting threads lowest priority value first.
+
+    Threads waiting at the same priority are served in the order they arrived.
+    """
+
+    def __init__(self):
+        self.metrics = WaitMetrics()
+        self._condition = threading.Condition(threading.Lock())
+        self._owner = None
+        self._depth = 0
+        self._waiters: list = []
+        self._sequence = itertools.count()
+
+    def acquire(self, priority: int = NORMAL) -> float:
+        """Block until the lock is ours and return how long that took in seconds."""
+        me = threading.get_ident()
+        with self._condition:
+            if self._owner == me:
+                self._depth += 1
+                return 0.0
+            start = time.perf_counter()
+            ticket = (priority, next(self._sequence))
+            heapq.heappush(self._waiters, ticket)
+            try:
+                while self._owner is not None or self._waiters[0] != ticket:
+                    self._condition.wait()
+            except BaseException:
+                # Interrupted, e.g. by KeyboardInterrupt, so give up our place in the queue
+                # or every waiter behind us would block forever.
+                self._waiters.remove(ticket)
+                heapq.heapify(self._waiters)
+                self._condition.notify_all()
+                raise
+            heapq.heappop(self._waiters)
+            self._owner = me
+            self._depth = 1
+            waited = time.perf_counter() - start
+            self.metrics.record(priority, waited)
+            return waited
+
+    def release(self) -> None:
+        """Release one level of ownership, waking the waiters once fully released."""
+        with self._condition:
+            if self._owner != threading.get_ident():
+                raise RuntimeError("Cannot release a lock owned by another thread.")
+            self._depth -= 1
+            if not self._depth:
+                self._owner = None
+                self._condition.notify_all()
+
+
+class SharedSession:
+    """Wrap a mode so several threads can share it without corrupting the reply stream.
+
+    Calling any method through the session runs it as one transaction.  Sequences that must not
+    be interleaved, such as start...stop or chip select low...high, go in a `transaction()`:
+
+    ```python
+    session = SharedSession(yabp.SPI("COM3"))
+    with session.transaction(priority=yabp.shared.HIGH) as spi:
+        spi.set_chip_select(high=False)
+        status = spi.send([0x05, 0x00])
+        spi.set_chip_select(high=True)
+    ```
+
+    Lower priority values jump ahead of higher ones waiting for the bus, so latency sensitive
+    polls can use `HIGH` while bulk transfers use `BULK`.
+    """
+
+    def __init__(self, mode):
+        self.mode = mode
+        self.lock = PriorityLock()
+
+    @contextmanager
+    def transaction(self, priority: int = NORMAL):
+        """Hold the bus for the duration of the with block."""
+        self.lock.acquire(priority)
+        try:
+            yield self.mode
+        finally:
+            self.lock.release()
+
+    def with_priority(self, priority: int) -> "_PriorityView":
+        """Return a view of the session whose method calls use the given priority."""
+        return _PriorityView(self, priority)
+
+    @property
+    def metrics(self) -> Dict[int, dict]:
+        """Return the lock wait statistics for each priority."""
+        return self.lock.metrics.summary()
+
+    def __getattr__(self, name):
+        return _PriorityView(self, NORMAL).__getattr__(name)
+
+
+class _PriorityView:
+    """Forward method calls to the session's mode, each as its own transaction."""
+
+    def __init__(self, session: SharedSession, priority: int):
+        self._session = session
+        self._priority = priority
+
+    def __getattr__(self, name):
+        attribute = getattr(self._session.mode, name)
+        if not callable(attribute):
+            return attribute
+
+        @functools.wraps(attribute)
+        def locked(*args, **kwargs):
+            with self._session.transaction(self._priority):
+                return attribute(*args, **kwargs)
+
+        return locked
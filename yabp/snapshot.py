@@ -0,0 +1,186 @@
+"""Compare register snapshots and keep a history of them on disk.
+
+`yabp.modes.i2c.I2C.snapshot()` reads a device's registers into a bytes object.  `diff()`
+lists what changed between two of them and `SnapshotHistory` keeps timestamped snapshots of
+several devices in a memory-mapped file, for watching configuration drift over a soak run:
+
+```python
+with SnapshotHistory("drift.ysnp", addresses=[0x20, 0x48]) as history:
+    history.watch(i2c, interval=1.0, duration=3600)
+    for timestamp, address, changes in history.changes():
+        print(timestamp, hex(address), changes)
+```
+
+The file starts with a header followed by a fixed number of fixed size records:
+
+    header: b"YABPSNP1" | start (uint16) | length (uint16) | capacity (uint32) |
+            records written (uint64) | address count (uint16) | addresses (uint8 each)
+    record: wall clock time (float64) | per address: read (uint8) and its snapshot
+
+All values are little endian.  An address that wasn't acknowledged has its read flag clear
+and comes back as None.  Once full, the oldest records are overwritten.
+"""
+import logging
+import mmap
+import os
+import struct
+import time
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+log = logging.getLogger("yabp.snapshot")
+
+MAGIC = b"YABPSNP1"
+_HEADER = struct.Struct("<8sHHIQH")
+_COUNT_OFFSET = 16  # Where the records written count sits in the header.
+_TIMESTAMP = struct.Struct("<d")
+
+
+def diff(before: bytes, after: bytes, start: int = 0) -> List[Tuple[int, int, int]]:
+    """Return (register, old value, new value) for every register that differs.
+
+    Identical snapshots are recognised with a single comparison, and only the bytes between
+    the first and last difference are looked at individually.
+    """
+    if before == after:
+        return []
+    if len(before) != len(after):
+        raise ValueError("Snapshots must be the same length to compare them.")
+    changed = int.from_bytes(before, "big") ^ int.from_bytes(after, "big")
+    first = len(before) - (changed.bit_length() + 7) // 8
+    last = len(before) - ((changed & -changed).bit_length() + 7) // 8
+    return [
+        (start + index, before[index], after[index])
+        for index in range(first, last + 1)
+        if before[index] != after[index]
+    ]
+
+
+class SnapshotHistory:
+    """A ring of timestamped snapshots of several devices in a memory-mapped file.
+
+    Opening an existing file continues it, as long as it was created for the same addresses
+    and register range.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        addresses: Sequence[int],
+        start: int = 0,
+        length: int = 256,
+        capacity: int = 86400,
+    ):
+        if capacity < 1:
+            raise ValueError(f"A snapshot history must hold at least 1 record, not {capacity}.")
+        self.path = path
+        self.addresses = list(addresses)
+        self.start = start
+        self.length = length
+        self.record_size = _TIMESTAMP.size + (1 + length) * len(self.addresses)
+        self._data_offset = _HEADER.size + len(self.addresses)
+        header = _HEADER.pack(MAGIC, start, length, capacity, 0, len(self.addresses))
+        header += bytes(self.addresses)
+
+        exists = os.path.exists(path) and os.path.getsize(path) > 0
+        self._file = open(path, "r+b" if exists else "w+b")
+        if exists:
+            existing = self._file.read(len(header))
+            magic, file_start, file_length, capacity, _, _ = _HEADER.unpack_from(existing)
+            if magic != MAGIC or (file_start, file_length) != (start, length):
+                raise ValueError(f"{path} is not a snapshot history of these registers.")
+            if existing[_HEADER.size :] != bytes(self.addresses):
+                raise ValueError(f"{path} holds snapshots of other addresses.")
+        else:
+            self._file.write(header)
+            self._file.truncate(self._data_offset + capacity * self.record_size)
+        self.capacity = capacity
+        self._map = mmap.mmap(self._file.fileno(), 0)
+
+    def __enter__(self):
+        """Allow using the history as a context manager."""
+        return self
+
+    def __exit__(self, *args):
+        """Flush and close the file."""
+        self.close()
+
+    @property
+    def total(self) -> int:
+        """Return how many records were ever written."""
+        return struct.unpack_from("<Q", self._map, _COUNT_OFFSET)[0]
+
+    def __len__(self) -> int:
+        return min(self.total, self.capacity)
+
+    def append(
+        self, snapshots: Dict[int, Optional[bytes]], timestamp: Optional[float] = None
+    ) -> None:
+        """Add one snapshot of every address, None for any that couldn't be read."""
+        total = self.total
+        offset = self._data_offset + (total % self.capacity) * self.record_size
+        _TIMESTAMP.pack_into(self._map, offset, time.time() if timestamp is None else timestamp)
+        offset += _TIMESTAMP.size
+        for address in self.addresses:
+            snapshot = snapshots[address]
+            if snapshot is not None and len(snapshot) != self.length:
+                raise ValueError(f"Expected {self.length} registers, got {len(snapshot)}.")
+            if snapshot is None:
+                self._map[offset] = 0
+            else:
+                self._map[offset] = 1
+                self._map[offset + 1 : offset + 1 + self.length] = snapshot
+            offset += 1 + self.length
+        struct.pack_into("<Q", self._map, _COUNT_OFFSET, total + 1)
+
+    def capture(self, i2c) -> Dict[int, Optional[bytes]]:
+        """Snapshot every address now and append them."""
+        snapshots = i2c.snapshot(self.addresses, self.start, self.length)
+        self.append(snapshots)
+        return snapshots
+
+    def watch(self, i2c, interval: float, duration: float) -> None:
+        """Capture every `interval` seconds for `duration` seconds."""
+        end = time.monotonic() + duration
+        next_capture = time.monotonic()
+        while next_capture < end:
+            self.capture(i2c)
+            next_capture += interval
+            time.sleep(max(0.0, next_capture - time.monotonic()))
+        self._map.flush()
+
+    def __getitem__(self, index: int) -> Tuple[float, Dict[int, Optional[bytes]]]:
+        """Return the timestamp and snapshots of a record, 0 being the oldest held."""
+        if not -len(self) <= index < len(self):
+            raise IndexError("Snapshot history index out of range.")
+        index %= len(self)
+        oldest = self.total - len(self)
+        offset = self._data_offset + ((oldest + index) % self.capacity) * self.record_size
+        (timestamp,) = _TIMESTAMP.unpack_from(self._map, offset)
+        offset += _TIMESTAMP.size
+        snapshots: Dict[int, Optional[bytes]] = {}
+        for address in self.addresses:
+            snapshot = bytes(self._map[offset + 1 : offset + 1 + self.length])
+            snapshots[address] = snapshot if self._map[offset] else None
+            offset += 1 + self.length
+        return timestamp, snapshots
+
+    def __iter__(self) -> Iterator[Tuple[float, Dict[int, Optional[bytes]]]]:
+        return (self[index] for index in range(len(self)))
+
+    def changes(self) -> Iterator[Tuple[float, int, List[Tuple[int, int, int]]]]:
+        """Yield (timestamp, address, diff) for every snapshot that differs from the last read."""
+        previous: Dict[int, bytes] = {}
+        for timestamp, snapshots in self:
+            for address, snapshot in snapshots.items():
+                if snapshot is None:
+                    continue
+                if address in previous and previous[address] != snapshot:
+                    yield timestamp, address, diff(previous[address], snapshot, self.start)
+                previous[address] = snapshot
+
+    def close(self) -> None:
+        """Flush and close the file."""
+        if not self._map.closed:
+            self._map.flush()
+            self._map.close()
+            self._file.close()
@@ -0,0 +1,337 @@
+r"""Watch I2C and SPI traffic between other devices with the firmware's sniffers.
+
+Both sniffers stream an escaped encoding of the bus:
+
+    I2C (0x0F): "[" start, "]" stop, "\" then a data byte, "+" ACK, "-" NACK
+    SPI (0x0D all traffic, 0x0E only while CS is low): "[" CS low, "]" CS high,
+                "\" then the MOSI byte and the MISO byte
+
+The raw stream is kept in a `yabp.streaming.RingBuffer` and decoded incrementally into
+transaction records as it arrives, so memory stays bounded however long the capture runs:
+
+```python
+with I2C("COM3").sniff(log_path="soak.ysnf") as sniffer:
+    for transaction in sniffer:
+        print(transaction)
+```
+
+Any byte sent to the Bus Pirate stops the sniffer.  A log written with `log_path` is read back
+with `read_log()`.  Requires numpy.
+"""
+import logging
+import struct
+import threading
+from collections import deque
+from typing import BinaryIO, Iterator, List, NamedTuple, Optional, Tuple, Union, cast
+
+import numpy as np
+
+from yabp.streaming import BackgroundReader, RingBuffer
+
+log = logging.getLogger("yabp.sniffer")
+
+MAGIC = b"YABPSNF1"
+_I2C_RECORD = struct.Struct("<dBBHH")  # timestamp, flags, address byte, length, ACK count
+_SPI_RECORD = struct.Struct("<dH")  # timestamp, length
+
+START, STOP, ESCAPE, ACK, NACK = b"[", b"]", b"\\", b"+", b"-"
+
+
+class I2CTransaction(NamedTuple):
+    """Everything between a start and the next start or stop.
+
+    `address` is the address byte including the read bit and `acks` holds whether the address
+    and each data byte were ACKed.
+    """
+
+    timestamp: float
+    address: Optional[int]
+    data: bytes
+    acks: Tuple[bool, ...]
+    stopped: bool  # False when a repeated start followed.
+
+    @property
+    def read(self) -> bool:
+        """Return whether the master was reading."""
+        return bool(self.address is not None and self.address & 0x01)
+
+    def pack(self) -> bytes:
+        """Encode the transaction for the binary log."""
+        flags = int(self.stopped) | (0x02 if self.address is None else 0)
+        header = _I2C_RECORD.pack(
+            self.timestamp, flags, self.address or 0, len(self.data), len(self.acks)
+        )
+        ack_bits = np.packbits(np.array(self.acks, dtype=bool)).tobytes()
+        return header + self.data + ack_bits
+
+    @classmethod
+    def unpack_from(cls, buffer, offset: int) -> Tuple["I2CTransaction", int]:
+        """Decode a transaction from the log and return it with the offset after it."""
+        timestamp, flags, address, length, ack_count = _I2C_RECORD.unpack_from(buffer, offset)
+        offset += _I2C_RECORD.size
+        data = bytes(buffer[offset : offset + length])
+        offset += length
+        ack_size = (ack_count + 7) // 8
+        bits = np.unpackbits(np.frombuffer(buffer[offset : offset + ack_size], dtype=np.uint8))
+        acks = tuple(bits[:ack_count].astype(bool).tolist())
+        record = cls(timestamp, None if flags & 0x02 else address, data, acks, bool(flags & 0x01))
+        return record, offset + ack_size
+
+
+class SPITransaction(NamedTuple):
+    """The MOSI and MISO bytes exchanged while chip select was low."""
+
+    timestamp: float
+    mosi: bytes
+    miso: bytes
+
+    def pack(self) -> bytes:
+        """Encode the transaction for the binary log."""
+        return _SPI_RECORD.pack(self.timestamp, len(self.mosi)) + self.mosi + self.miso
+
+    @classmethod
+    def unpack_from(cls, buffer, offset: int) -> Tuple["SPITransaction", int]:
+        """Decode a transaction from the log and return it with the offset after it."""
+        timestamp, length = _SPI_RECORD.unpack_from(buffer, offset)
+        offset += _SPI_RECORD.size
+        mosi = bytes(buffer[offset : offset + length])
+        miso = bytes(buffer[offset + length : offset + 2 * length])
+        return cls(timestamp, mosi, miso), offset + 2 * length
+
+
+class I2CDecoder:
+    """Turn the I2C sniffer's stream into `I2CTransaction`s a chunk at a time.
+
+    Transactions longer than `max_length` bytes are split so a stuck bus can't grow memory.
+    """
+
+    KIND = b"I2C"
+    RECORD = I2CTransaction
+
+    def __init__(self, max_length: int = 4096):
+        self.max_length = max_length
+        self._escaped = False
+        self._timestamp: Optional[float] = None  # Set while inside a transaction.
+        self._address: Optional[int] = None
+        self._expect_address = False
+        self._data = bytearray()
+        self._acks: List[bool] = []
+
+    def feed(self, data: bytes, timestamp: float) -> List[I2CTransaction]:
+        """Decode a chunk of the stream and return the transactions it completed."""
+        finished: List[I2CTransaction] = []
+        for byte in data:
+            if self._escaped:
+                self._escaped = False
+                self._add_byte(byte, timestamp, finished)
+            elif byte == ESCAPE[0]:
+                self._escaped = True
+            elif byte in (ACK[0], NACK[0]):
+                self._acks.append(byte == ACK[0])
+            elif byte == START[0]:
+                if self._timestamp is not None:
+                    finished.append(self._finish(stopped=False))
+                self._timestamp = timestamp
+                self._address = None
+                self._expect_address = True
+            elif byte == STOP[0] and self._timestamp is not None:
+                finished.append(self._finish(stopped=True))
+        return finished
+
+    def _add_byte(self, byte: int, timestamp: float, finished: List[I2CTransaction]) -> None:
+        """Add the address or a data byte, splitting off overlong transactions."""
+        if self._timestamp is None:
+            self._timestamp = timestamp
+        if self._expect_address:
+            self._expect_address = False
+            self._address = byte
+            return
+        self._data.append(byte)
+        if len(self._data) >= self.max_length:
+            finished.append(self._finish(stopped=False))
+
+    def _finish(self, stopped: bool) -> I2CTransaction:
+        timestamp = cast(float, self._timestamp)  # Always set inside a transaction.
+        record = I2CTransaction(
+            timestamp, self._address, bytes(self._data), tuple(self._acks), stopped
+        )
+        self._timestamp = None
+        self._address = None
+        self._data = bytearray()
+        self._acks = []
+        return record
+
+
+class SPIDecoder:
+    """Turn the SPI sniffer's stream into `SPITransaction`s a chunk at a time.
+
+    Bytes seen outside of chip select (only sent by the all traffic sniffer) are collected into
+    transactions of their own.  Transactions longer than `max_length` bytes are split.
+    """
+
+    KIND = b"SPI"
+    RECORD = SPITransaction
+
+    def __init__(self, max_length: int = 4096):
+        self.max_length = max_length
+        self._remaining = 0  # Bytes left of an escaped MOSI/MISO pair.
+        self._timestamp: Optional[float] = None
+        self._mosi = bytearray()
+        self._miso = bytearray()
+
+    def feed(self, data: bytes, timestamp: float) -> List[SPITransaction]:
+        """Decode a chunk of the stream and return the transactions it completed."""
+        finished: List[SPITransaction] = []
+        for byte in data:
+            if self._remaining:
+                self._remaining -= 1
+                if self._timestamp is None:
+                    self._timestamp = timestamp
+                (self._mosi if self._remaining else self._miso).append(byte)
+                if not self._remaining and len(self._mosi) >= self.max_length:
+                    finished.append(self._finish())
+            elif byte == ESCAPE[0]:
+                self._remaining = 2
+            elif byte in (START[0], STOP[0]):
+                if self._mosi:
+                    finished.append(self._finish())
+                self._timestamp = timestamp if byte == START[0] else None
+        return finished
+
+    def _finish(self) -> SPITransaction:
+        timestamp = cast(float, self._timestamp)  # Set by the first byte exchanged.
+        record = SPITransaction(timestamp, bytes(self._mosi), bytes(self._miso))
+        self._timestamp = None
+        self._mosi = bytearray()
+        self._miso = bytearray()
+        return record
+
+
+class Sniffer:
+    """Run one of the firmware sniffers and decode its output on a background thread.
+
+    The last `capacity` bytes of the raw stream stay in `raw`, and at most `capacity`
+    transactions wait to be consumed by iterating over the sniffer; older ones are counted in
+    `dropped`.  With `log_path`, every transaction is also appended to a binary log.
+    """
+
+    STOP_BYTE = b"\x01"  # Harmless if it were not consumed: it only asks for the mode name.
+
+    def __init__(
+        self,
+        mode,
+        command: bytes,
+        decoder: Union[I2CDecoder, SPIDecoder],
+        capacity: int = 65536,
+        log_path: Optional[str] = None,
+    ):
+        self.mode = mode
+        self.command = command
+        self.decoder = decoder
+        self.raw = RingBuffer(capacity, dtype=np.uint8)
+        self.transactions: deque = deque(maxlen=capacity)
+        self.total = 0
+        self.consumed = 0
+        self.log_path = log_path
+        self._log: Optional[BinaryIO] = None
+        self._reader: Optional[BackgroundReader] = None
+        self._arrived = threading.Condition()
+
+    def __enter__(self):
+        """Start sniffing when used as a context manager."""
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        """Stop sniffing when leaving the context manager."""
+        self.stop()
+
+    @property
+    def running(self) -> bool:
+        """Return whether the background reader is currently capturing."""
+        return self._reader is not None
+
+    @property
+    def dropped(self) -> int:
+        """Return how many transactions were discarded before being consumed."""
+        return self.total - len(self.transactions) - self.consumed
+
+    def start(self) -> None:
+        """Send the sniffer command and start the background reader."""
+        if self.running:
+            return
+        if self.log_path and self._log is None:
+            self._log = open(self.log_path, "ab", buffering=1 << 16)
+            self._log.write(MAGIC + self.decoder.KIND)
+        self.mode.command(self.command)
+        self._reader = BackgroundReader(self.mode.serial, self._on_data)
+        self._reader.start()
+        log.debug(f"Started sniffing with {self.command.hex()}.")
+
+    def stop(self) -> None:
+        """Send a byte to end the sniffer, stop the reader and close the log."""
+        if self._reader is None:
+            return
+        self.mode.serial.write(self.STOP_BYTE)
+        self._reader.stop()
+        self._reader = None
+        self.mode.serial.reset_input_buffer()
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+        with self._arrived:
+            self._arrived.notify_all()
+        log.debug(f"Stopped sniffing after {self.total} transactions.")
+
+    def _on_data(self, data: bytes, timestamp: float) -> None:
+        """Store and decode a chunk of the stream."""
+        self.raw.extend(np.frombuffer(data, dtype=np.uint8), np.full(len(data), timestamp))
+        records = self.decoder.feed(data, timestamp)
+        if not records:
+            return
+        if self._log is not None:
+            self._log.write(b"".join(record.pack() for record in records))
+        with self._arrived:
+            self.transactions.extend(records)
+            self.total += len(records)
+            self._arrived.notify_all()
+
+    def __iter__(self) -> Iterator[Union[I2CTransaction, SPITransaction]]:
+        """Yield transactions as they are decoded until the sniffer is stopped."""
+        while True:
+            with self._arrived:
+                while not self.transactions and self.running:
+                    self._arrived.wait(0.1)
+                if not self.transactions:
+                    return
+                record = self.transactions.popleft()
+                self.consumed += 1
+            yield record
+
+
+def read_log(path: str) -> List[Union[I2CTransaction, SPITransaction]]:
+    """Read every transaction from a sniffer log.
+
+    A log cut off mid record, e.g. by a crash while sniffing, is read up to the last whole one.
+    """
+    with open(path, "rb") as log_file:
+        content = log_file.read()
+    records: List[Union[I2CTransaction, SPITransaction]] = []
+    offset = 0
+    while offset < len(content):
+        if content[offset : offset + len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a yabp sniffer log.")
+        kind = content[offset + len(MAGIC) : offset + len(MAGIC) + 3]
+        record_type = I2CTransaction if kind == b"I2C" else SPITransaction
+        offset += len(MAGIC) + 3
+        while offset < len(content) and content[offset : offset + len(MAGIC)] != MAGIC:
+            try:
+                record, end = record_type.unpack_from(content, offset)
+            except struct.error:
+                end = len(content) + 1
+            if end > len(content):
+                log.warning(f"{path} ends with a truncated record, which was skipped.")
+                return records
+            records.append(record)
+            offset = end
+    return records
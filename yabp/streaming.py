@@ -0,0 +1,247 @@
+"""Background capture of continuous Bus Pirate output into bounded NumPy buffers."""
+import logging
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+from yabp.exceptions import CommandError
+from yabp.modes.base import ADC_SCALE, Base
+
+log = logging.getLogger("yabp.streaming")
+
+
+class RingBuffer:
+    """Fixed capacity buffer of timestamped samples.
+
+    Once full, the oldest samples are overwritten so the memory footprint never grows past the
+    two preallocated arrays.
+    """
+
+    def __init__(self, capacity: int, dtype=np.float64):
+        if capacity < 1:
+            raise ValueError(f"Capacity must be at least one sample. {capacity} was requested.")
+        self.capacity = capacity
+        self.values = np.zeros(capacity, dtype=dtype)
+        self.timestamps = np.zeros(capacity, dtype=np.float64)
+        self.total = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return min(self.total, self.capacity)
+
+    @property
+    def dropped(self) -> int:
+        """Return how many samples have been overwritten."""
+        return max(0, self.total - self.capacity)
+
+    def extend(self, values: np.ndarray, timestamps: np.ndarray) -> None:
+        """Append a block of samples, overwriting the oldest ones if needed."""
+        count = len(values)
+        if count > self.capacity:
+            values = values[-self.capacity :]
+            timestamps = timestamps[-self.capacity :]
+        with self._lock:
+            start = (self.total + count - len(values)) % self.capacity
+            first = min(len(values), self.capacity - start)
+            self.values[start : start + first] = values[:first]
+            self.timestamps[start : start + first] = timestamps[:first]
+            self.values[: len(values) - first] = values[first:]
+            self.timestamps[: len(values) - first] = timestamps[first:]
+            self.total += count
+
+    def clear(self) -> None:
+        """Forget every sample."""
+        with self._lock:
+            self.total = 0
+
+    def data(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Return a copy of the (timestamps, values) held, oldest first."""
+        with self._lock:
+            if self.total <= self.capacity:
+                return self.timestamps[: self.total].copy(), self.values[: self.total].copy()
+            start = self.total % self.capacity
+            order = np.r_[start : self.capacity, 0:start]
+            return self.timestamps[order], self.values[order]
+
+
+class BackgroundReader(threading.Thread):
+    """Drain a serial port on a daemon thread and hand each chunk to a callback.
+
+    The callback receives the bytes read and the `time.perf_counter()` when they arrived.
+    """
+
+    def __init__(
+        self, serial_port, callback: Callable[[bytes, float], None], chunk_size: int = 4096
+    ):
+        super().__init__(name="yabp-reader", daemon=True)
+        self.serial = serial_port
+        self.callback = callback
+        self.chunk_size = chunk_size
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        """Read until asked to stop."""
+        while not self._stop_event.is_set():
+            data = self.serial.read(max(1, min(self.serial.in_waiting, self.chunk_size)))
+            if data:
+                self.callback(data, time.perf_counter())
+
+    def stop(self) -> None:
+        """Ask the thread to finish and wait for the read in progress to time out."""
+        self._stop_event.set()
+        self.join()
+
+
+class VoltageStream:
+    """Continuous ADC capture from the Bus Pirate's voltage probe.
+
+    Samples are decoded in blocks, never one at a time, into a `RingBuffer` of volts.  Each
+    block is timestamped by spreading it evenly between the arrival of the previous block and
+    its own arrival.
+
+    Example:
+    -------
+    ```python
+    with bp.stream_voltage(capacity=100_000) as stream:
+        time.sleep(1)
+    timestamps, volts = stream.data()
+    ```
+
+    """
+
+    STOP_BYTE = b"\x00"
+
+    def __init__(self, mode, capacity: int = 65536, chunk_size: int = 4096):
+        self.mode = mode
+        self.buffer = RingBuffer(capacity)
+        self.chunk_size = chunk_size
+        self._reader: Optional[BackgroundReader] = None
+        self._leftover = b""
+        self._last_timestamp: Optional[float] = None
+
+    def __enter__(self):
+        """Start streaming when used as a context manager."""
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        """Stop streaming when leaving the context manager."""
+        self.stop()
+
+    @property
+    def running(self) -> bool:
+        """Return whether the background reader is currently capturing."""
+        return self._reader is not None
+
+    def start(self) -> None:
+        """Start continuous ADC mode (0x15) and the background reader.
+
+        Calling this after `stop()` resumes appending to the same buffer.
+        """
+        if self.running:
+            return
+        self._leftover = b""
+        self._last_timestamp = None
+        self.mode.serial.reset_input_buffer()
+        self.mode.serial.write(b"\x15")
+        self._reader = BackgroundReader(self.mode.serial, self._on_data, self.chunk_size)
+        self._reader.start()
+        log.debug("Started continuous ADC capture.")
+
+    resume = start
+
+    def stop(self) -> None:
+        """Send any byte to end continuous ADC mode and stop the reader."""
+        if self._reader is None:
+            return
+        self.mode.serial.write(self.STOP_BYTE)
+        self._reader.stop()
+        self._reader = None
+        self.mode.serial.reset_input_buffer()
+        log.debug(f"Stopped continuous ADC capture after {self.buffer.total} samples.")
+
+    def data(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Return the captured (timestamps, volts), oldest first."""
+        return self.buffer.data()
+
+    def _on_data(self, data: bytes, timestamp: float) -> None:
+        """Decode a chunk of big endian 16 bit readings."""
+        data = self._leftover + data
+        count = len(data) // 2
+        self._leftover = data[count * 2 :]
+        if not count:
+            return
+        volts = np.frombuffer(data, dtype=">u2", count=count) * ADC_SCALE
+        if self._last_timestamp is None:
+            timestamps = np.full(count, timestamp)
+        else:
+            timestamps = np.linspace(self._last_timestamp, timestamp, count + 1)[1:]
+        self._last_timestamp = timestamp
+        self.buffer.extend(volts, timestamps)
+
+
+class LogicSamples:
+    """Pin levels sampled by `Base.sample_pins()`.
+
+    `states` holds the raw AUX|MOSI|CLK|MISO|CS bytes and `planes` one boolean column per pin,
+    in the order of `Base.PINS`.
+    """
+
+    def __init__(self, states: np.ndarray, timestamps: np.ndarray):
+        self.states = states
+        self.timestamps = timestamps
+        self.planes = np.unpackbits(states[:, np.newaxis], axis=1)[:, 3:].astype(bool)
+
+    def __len__(self) -> int:
+        return len(self.states)
+
+    def pin(self, name: str) -> np.ndarray:
+        """Return the levels of one pin."""
+        return self.planes[:, Base.PINS.index(name)]
+
+    def edges(self, name: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Return the timestamps of every change of a pin and whether each was rising."""
+        levels = self.pin(name)
+        changes = np.flatnonzero(levels[1:] != levels[:-1]) + 1
+        return self.timestamps[changes], levels[changes]
+
+    def edge_counts(self) -> Dict[str, int]:
+        """Return how many times each pin changed."""
+        changes = np.count_nonzero(self.planes[1:] != self.planes[:-1], axis=0)
+        return dict(zip(Base.PINS, changes.tolist()))
+
+
+def sample_pins(mode: Base, count: int, burst: int = 1024) -> LogicSamples:
+    """Sample the pins by repeating the current pin direction command, which changes nothing.
+
+    Commands go out in bursts of `burst` bytes with the next burst written before the previous
+    one's replies are read, so the link never waits on a round trip.  The Bus Pirate replies
+    with one byte per command, so the replies can never outrun the commands.  Each burst is
+    timestamped by spreading it evenly between the arrival of the previous burst and its own.
+    """
+    command = bytes([mode._config_pin_direction])
+    states = np.empty(count, dtype=np.uint8)
+    timestamps = np.empty(count, dtype=np.float64)
+    sizes = [min(burst, count - offset) for offset in range(0, count, burst)]
+
+    mode.serial.reset_input_buffer()
+    last_timestamp = time.perf_counter()
+    if sizes:
+        mode.serial.write(command * sizes[0])
+    offset = 0
+    for index, size in enumerate(sizes):
+        if index + 1 < len(sizes):
+            mode.serial.write(command * sizes[index + 1])
+        reply = mode._read(size)
+        if len(reply) != size:
+            raise CommandError(f"Only {offset + len(reply)} of {count} pin samples arrived.")
+        timestamp = time.perf_counter()
+        states[offset : offset + size] = np.frombuffer(reply, dtype=np.uint8) & 0x1F
+        timestamps[offset : offset + size] = np.linspace(last_timestamp, timestamp, size + 1)[1:]
+        last_timestamp = timestamp
+        offset += size
+    mode.pin_state = int(states[-1]) if count else mode.pin_state
+    log.debug(f"Sampled the pins {count} times.")
+    return LogicSamples(states, timestamps)
@@ -0,0 +1,70 @@
+"""Size aware read deadlines for replies from the Bus Pirate.
+
+How long a reply takes is the adapter's round trip latency (USB scheduling, the FTDI latency
+timer, firmware) plus the time to clock the bytes over the host link and the target bus.  The
+latency is learned from every complete reply the same way TCP estimates its retransmission
+timeout: a smoothed mean plus four times the smoothed mean deviation.  It never drops below the
+16ms latency timer FTDI adapters default to, which a quiet link can beat a few times in a row.
+"""
+import math
+from typing import Optional
+
+HOST_BITS_PER_BYTE = 10  # Start and stop bits around each byte on the host UART.
+
+
+class ReplyTimer:
+    """Work out the read deadline for a reply of a given size.
+
+    The first estimate matches the historic fixed 0.1s timeout and tightens as replies arrive.
+    """
+
+    MINIMUM_LATENCY = 0.016
+    MAXIMUM_LATENCY = 1.0
+
+    def __init__(self, baud_rate: Optional[int] = 115200, latency: float = 0.05):
+        self.baud_rate = baud_rate  # None for serial-like objects without one, read as 115200.
+        self.bus_byte_time = 0.0
+        self.smoothed_latency = latency
+        self.latency_deviation = latency / 4
+        self.samples = 0
+
+    @property
+    def latency(self) -> float:
+        """Return the latency budget given to every reply."""
+        latency = self.smoothed_latency + 4 * self.latency_deviation
+        return min(max(latency, self.MINIMUM_LATENCY), self.MAXIMUM_LATENCY)
+
+    def set_bus_rate(self, bits_per_second: float, bits_per_byte: int = 8) -> None:
+        """Record the target bus clock so replies waiting on bus traffic get more time."""
+        self.bus_byte_time = bits_per_byte / bits_per_second
+
+    def transfer_time(self, reply_bytes: int, bus_bytes: int = 0) -> float:
+        """Return the time spent moving bytes over the host link and the target bus."""
+        host_byte_time = HOST_BITS_PER_BYTE / (self.baud_rate or 115200)
+        return reply_bytes * host_byte_time + bus_bytes * self.bus_byte_time
+
+    def deadline(self, reply_bytes: int, bus_bytes: int = 0) -> float:
+        """Return the timeout for a reply, rounded up to whole milliseconds.
+
+        Rounding keeps the same value for similar replies so the serial port isn't reconfigured
+        on every read.
+        """
+        seconds = self.latency + 1.5 * self.transfer_time(reply_bytes, bus_bytes)
+        return math.ceil(seconds * 1000) / 1000
+
+    def learn(self, elapsed: float, reply_bytes: int, bus_bytes: int = 0) -> None:
+        """Update the latency estimate from a reply that arrived in full.
+
+        The initial latency counts as an earlier sample, so one lucky reply can't set the estimate.
+        """
+        observed = max(0.0, elapsed - self.transfer_time(reply_bytes, bus_bytes))
+        error = observed - self.smoothed_latency
+        self.smoothed_latency += error / 8
+        self.latency_deviation += (abs(error) - self.latency_deviation) / 4
+        self.samples += 1
+
+    def back_off(self) -> None:
+        """Widen the latency budget after a reply came up short."""
+        self.latency_deviation = min(
+            max(self.latency_deviation * 2, self.MINIMUM_LATENCY), self.MAXIMUM_LATENCY
+        )
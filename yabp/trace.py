@@ -0,0 +1,174 @@
+"""Record a timeline of bus activity in the Chrome trace event format.
+
+Traces open in Perfetto (https://ui.perfetto.dev) or chrome://tracing and show each device
+operation, the mode calls it makes and the serial writes and reads underneath as nested spans,
+so the gaps spent waiting on round trips are easy to spot:
+
+```python
+tracer = Tracer()
+with yabp.I2C() as bp:
+    bp.trace(tracer)
+    gpio_expander = tracer.attach(MCP23017(0x20, bp), "device")
+    gpio_expander.set_all_direction(gpio_expander.DIRECTION.OUTPUT)
+tracer.save("fixture.json")
+```
+
+Nothing is traced until an object is attached, and events are only kept in memory until
+`save()` writes them out in one go.
+"""
+import functools
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Optional
+
+log = logging.getLogger("yabp.trace")
+
+
+class Tracer:
+    """Collect complete ("X") trace events in memory.
+
+    Events on the same thread nest by time, so a span started inside another is drawn beneath
+    it.  With a `path`, the tracer can be used as a context manager that saves on exit.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.events: List[dict] = []
+        self._pid = os.getpid()
+        self._start = time.perf_counter()
+        self._attached: dict = {}  # id(obj) -> (obj, names of wrapped methods)
+
+    def __enter__(self):
+        """Allow using the tracer as a context manager."""
+        return self
+
+    def __exit__(self, *args):
+        """Save the trace if a path was given."""
+        if self.path:
+            self.save(self.path)
+
+    def now(self) -> float:
+        """Return microseconds since the tracer was created."""
+        return (time.perf_counter() - self._start) * 1e6
+
+    def add(self, name: str, category: str, start: float, end: float, **args) -> None:
+        """Add a span that ran from `start` to `end`, both in microseconds."""
+        event = {
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": start,
+            "dur": end - start,
+            "pid": self._pid,
+            "tid": threading.get_ident(),
+        }
+        if args:
+            event["args"] = args
+        self.events.append(event)
+
+    @contextmanager
+    def span(self, name: str, category: str = "user", **args):
+        """Time the with block as a span, e.g. around one step of a test fixture."""
+        start = self.now()
+        try:
+            yield
+        finally:
+            self.add(name, category, start, self.now(), **args)
+
+    def attach(self, obj, category: str = "device"):
+        """Trace every call to the public methods of `obj` and return it.
+
+        The methods are wrapped on the instance, so other instances of the class and the class
+        itself are unaffected.  `detach()` removes the wrappers again.
+        """
+        names = []
+        for name, _ in inspect.getmembers(type(obj), inspect.isfunction):
+            if name.startswith("_"):
+                continue
+            setattr(obj, name, self._wrap(getattr(obj, name), category))
+            names.append(name)
+        self._attached[id(obj)] = (obj, names)
+        return obj
+
+    def detach(self, obj) -> None:
+        """Stop tracing an object's methods."""
+        _, names = self._attached.pop(id(obj), (None, []))
+        for name in names:
+            delattr(obj, name)
+
+    def _wrap(self, method, category: str):
+        name = f"{type(method.__self__).__name__}.{method.__name__}"
+
+        @functools.wraps(method)
+        def traced(*args, **kwargs):
+            start = self.now()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self.add(name, category, start, self.now())
+
+        return traced
+
+    def save(self, path: str) -> None:
+        """Write every event collected so far as a trace event JSON file."""
+        metadata = {
+            "name": "process_name",
+            "ph": "M",
+            "pid": self._pid,
+            "args": {"name": "yabp"},
+        }
+        with open(path, "w") as trace_file:
+            json.dump({"traceEvents": [metadata] + self.events}, trace_file)
+        log.info(f"Saved {len(self.events)} trace events to {path}")
+
+
+class TracingSerial:
+    """Wrap a serial port and add a span for every write and read.
+
+    Reads record how many bytes were asked for and received, so short reads that ran into the
+    timeout stand out.  Anything else is passed through to the wrapped port.
+    """
+
+    _OWN_ATTRIBUTES = ("serial", "tracer")
+
+    def __init__(self, serial_port, tracer: Tracer):
+        self.serial = serial_port
+        self.tracer = tracer
+
+    def __getattr__(self, name):
+        return getattr(self.serial, name)
+
+    def __setattr__(self, name, value):
+        if name in self._OWN_ATTRIBUTES:
+            super().__setattr__(name, value)
+        else:
+            setattr(self.serial, name, value)
+
+    def write(self, data) -> int:
+        """Write to the serial port inside a span."""
+        start = self.tracer.now()
+        try:
+            return self.serial.write(data)
+        finally:
+            self.tracer.add("write", "serial", start, self.tracer.now(), bytes=len(data))
+
+    def read(self, size: int = 1) -> bytes:
+        """Read from the serial port inside a span."""
+        start = self.tracer.now()
+        data = b""
+        try:
+            data = self.serial.read(size)
+            return data
+        finally:
+            self.tracer.add(
+                "read", "serial", start, self.tracer.now(), requested=size, received=len(data)
+            )
+
+    def stop(self):
+        """Stop tracing and return the wrapped serial port."""
+        return self.serial